@@ -1,47 +1,127 @@
 import pygame
+import numpy as np
 import random
 import math
-
-pygame.init()
-
-info = pygame.display.Info()
-WIDTH, HEIGHT = info.current_w, info.current_h
-
-screen = pygame.display.set_mode(
-    (WIDTH, HEIGHT),
-    pygame.NOFRAME
-)
-
-pygame.event.set_blocked(None)
-pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP])
-
-clock = pygame.time.Clock()
+import argparse
+import json
+import csv
+import os
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import deque
 
 BOIDS_PER_COLOR = 50
-MAX_BOIDS = 4*BOIDS_PER_COLOR+10
 MAX_SPEED = 5
 MAX_FORCE = 0.05
+MAX_PARTICLES = 24000
+PARTICLES_PER_BOID = 2
+PARTICLE_DECAY = 5
+PARTICLE_SHRINK = 0.97
+TICK_RATE = 60
+MAX_DT = 2.0
 
-BAR_GAP = HEIGHT // 25
-BAR_WIDTH = WIDTH // 35
 BAR_OFFSET = 0
 
-REPULSION_RADIUS = HEIGHT // 10
 REPULSION_FORCE = 0.1
 HALO_RADIUS = 2
 
-mouse_kill_active = False
-mouse_left_down = False
-mouse_spawn_color = None
+BG_COLOR = (40, 60, 90)
+HALO_COLOR = (150, 100, 255)
+HALO_KILL_COLOR = (255, 60, 60)
+
 
-COLORS = {
-    "white": ((255, 255, 255), pygame.Rect(BAR_OFFSET, 0, BAR_WIDTH, HEIGHT // 2 - BAR_GAP // 2)),
-    "red": ((255, 60, 60), pygame.Rect(BAR_OFFSET, HEIGHT // 2 + BAR_GAP // 2, BAR_WIDTH, HEIGHT // 2 - BAR_GAP // 2)),
-    "green": ((60, 255, 60), pygame.Rect(WIDTH - BAR_OFFSET - BAR_WIDTH, 0, BAR_WIDTH, HEIGHT // 2 - BAR_GAP // 2)),
-    "yellow": ((230, 200, 40), pygame.Rect(WIDTH - BAR_OFFSET - BAR_WIDTH, HEIGHT // 2 + BAR_GAP // 2, BAR_WIDTH, HEIGHT // 2 - BAR_GAP // 2)),
-}
+# Everything that depends on the screen size. main() calls this again with the real
+# display size; until then the module works on a 1080p playfield so it can run headless.
+def configure(width, height):
+    global WIDTH, HEIGHT, BAR_GAP, BAR_WIDTH, REPULSION_RADIUS, PERCEPTION
+    global COLORS, BAR_RECTS, BAR_CENTERS, BAR_INNER_LEFT, BAR_INNER_RIGHT
+    WIDTH, HEIGHT = width, height
+
+    BAR_GAP = HEIGHT // 25
+    BAR_WIDTH = WIDTH // 35
+    REPULSION_RADIUS = HEIGHT // 10
+    PERCEPTION = HEIGHT // 4
+
+    COLORS = {
+        "white": ((255, 255, 255), pygame.Rect(BAR_OFFSET, 0, BAR_WIDTH, HEIGHT // 2 - BAR_GAP // 2)),
+        "red": ((255, 60, 60), pygame.Rect(BAR_OFFSET, HEIGHT // 2 + BAR_GAP // 2, BAR_WIDTH, HEIGHT // 2 - BAR_GAP // 2)),
+        "green": ((60, 255, 60), pygame.Rect(WIDTH - BAR_OFFSET - BAR_WIDTH, 0, BAR_WIDTH, HEIGHT // 2 - BAR_GAP // 2)),
+        "yellow": ((230, 200, 40), pygame.Rect(WIDTH - BAR_OFFSET - BAR_WIDTH, HEIGHT // 2 + BAR_GAP // 2, BAR_WIDTH, HEIGHT // 2 - BAR_GAP // 2)),
+    }
+    BAR_RECTS = np.array([(r.left, r.top, r.right, r.bottom) for _, r in COLORS.values()], dtype=np.float64)
+    BAR_CENTERS = np.array([r.center for _, r in COLORS.values()], dtype=np.float64)
+    # Bars hug the left and right edges: anything between these two x values can't touch one
+    BAR_INNER_LEFT = BAR_OFFSET + BAR_WIDTH
+    BAR_INNER_RIGHT = WIDTH - BAR_OFFSET - BAR_WIDTH
+
+
+configure(1920, 1080)
 COLOR_NAMES = list(COLORS.keys())
 
+# Per-color lookup tables for the array engine, indexed by position in COLOR_NAMES
+COLOR_RGB = [COLORS[name][0] for name in COLOR_NAMES]
+COLOR_TABLE = np.array(COLOR_RGB, dtype=np.uint8)
+
+
+# Sprite cache: every circle is rendered once and then blitted.
+# pygame.draw writes straight RGB onto the opaque screen, so the boid and particle
+# sprites are baked opaque to look exactly like the circles they replace.
+_sprites = {}
+
+
+def circle_sprite(color, radius, alpha=255):
+    key = (tuple(color), radius, alpha)
+    sprite = _sprites.get(key)
+    if sprite is None:
+        size = 2 * radius + 2
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, (*color, alpha), (radius + 1, radius + 1), radius)
+        sprite = sprite.convert_alpha()
+        _sprites[key] = sprite
+    return sprite
+
+
+def boid_sprite(color, glow=True):
+    key = ("boid", tuple(color), glow)
+    sprite = _sprites.get(key)
+    if sprite is None:
+        r = HALO_RADIUS + 1
+        sprite = pygame.Surface((2 * r + 2, 2 * r + 2), pygame.SRCALPHA)
+        for size in ((HALO_RADIUS, HALO_RADIUS + 1, 1) if glow else (1,)):
+            pygame.draw.circle(sprite, color, (r + 1, r + 1), size)
+        sprite = sprite.convert_alpha()
+        _sprites[key] = sprite
+    return sprite
+
+
+def halo_sprite(color):
+    key = ("halo", tuple(color))
+    sprite = _sprites.get(key)
+    if sprite is None:
+        sprite = pygame.Surface((REPULSION_RADIUS * 2, REPULSION_RADIUS * 2), pygame.SRCALPHA)
+        for i in range(REPULSION_RADIUS, 0, -1):
+            alpha = int(50 * (i / REPULSION_RADIUS))
+            pygame.draw.circle(sprite, (*color, alpha), (REPULSION_RADIUS, REPULSION_RADIUS), i)
+        sprite = sprite.convert_alpha()
+        _sprites[key] = sprite
+    return sprite
+
+
+BOID_SPRITE_OFFSET = HALO_RADIUS + 2
+
+
+# Needs a display mode, so it runs from main() once the window exists
+def build_sprites():
+    _sprites.clear()
+    for color in COLOR_RGB:
+        boid_sprite(color)
+        boid_sprite(color, glow=False)
+        for r in range(1, 5):
+            circle_sprite(color, r)
+    halo_sprite(HALO_COLOR)
+    halo_sprite(HALO_KILL_COLOR)
+
 
 def limit(vec, max_val):
     mag = math.sqrt(vec[0] ** 2 + vec[1] ** 2)
@@ -50,22 +130,205 @@ def limit(vec, max_val):
     return pygame.Vector2(vec)
 
 
-class Particle:
-    def __init__(self, pos, color):
-        self.pos = pygame.Vector2(pos)
-        self.color = color
-        self.radius = random.randint(2, 4)
-        self.life = 255
-    def update(self):
-        self.life -= 5
-        self.radius *= 0.97
+# Fixed-capacity ring buffer of particles stored as parallel arrays.
+# Every particle lives exactly 255 / PARTICLE_DECAY frames, so slots die in the order they
+# were written and the write head always lands on the oldest slot: recycling is O(1) and
+# memory never grows past the cap.
+class ParticlePool:
+    def __init__(self, capacity, seed=None):
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.radius = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.int16)
+        self.head = 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.life > 0))
+
+    def emit_many(self, pos, color, count=1):
+        pos = np.repeat(pos, count, axis=0)[-self.capacity:]
+        color = np.repeat(color, count, axis=0)[-self.capacity:]
+        k = len(pos)
+        if k == 0:
+            return
+        slots = (self.head + np.arange(k)) % self.capacity
+        self.pos[slots] = pos
+        self.color[slots] = color
+        self.radius[slots] = self.rng.integers(2, 5, size=k)
+        self.life[slots] = 255
+        self.head = (self.head + k) % self.capacity
+
+    def update(self, dt=1.0):
+        np.subtract(self.life, round(PARTICLE_DECAY * dt), out=self.life)
+        np.maximum(self.life, 0, out=self.life)
+        self.radius *= PARTICLE_SHRINK ** dt
+
     def draw(self, surf):
-        if self.life > 0:
-            col = (*self.color, max(self.life, 0))
-            pygame.draw.circle(surf, col, (int(self.pos.x), int(self.pos.y)), int(self.radius))
+        r = self.radius.astype(np.int32)
+        live = np.flatnonzero((self.life > 0) & (r > 0))
+        r = r[live]
+        topleft = self.pos[live].astype(np.int32) - (r + 1)[:, None]
+        # Look each distinct (color, radius) sprite up once, not once per particle
+        rgb = self.color[live].astype(np.int64)
+        keys = ((rgb[:, 0] << 16 | rgb[:, 1] << 8 | rgb[:, 2]) << 3) | r
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        table = np.empty(len(uniq), dtype=object)
+        table[:] = [circle_sprite(((k >> 19) & 255, (k >> 11) & 255, (k >> 3) & 255), k & 7)
+                    for k in uniq.tolist()]
+        surf.blits(zip(table[inverse].tolist(), topleft.tolist()), doreturn=False)
+
+
+# Uniform grid over the playfield, rebuilt once per refresh. Boids of each color are
+# sorted by cell (row-major), so any run of cells along a row is one contiguous slice,
+# and running sums of x and y over that order give the (x, y, count) totals of a run in
+# O(1). Cohesion only needs those totals: for the boids of one cell, runs of cells lying
+# wholly inside the perception circle of every point of that cell are added from the
+# running sums, and only the ring of cells straddling the circle is distance-tested.
+# Boids outside the playfield (through the gap between the bars) are always tested.
+class SpatialGrid:
+    SMALL_BATCH = 256
+
+    def __init__(self, radius):
+        self.radius = radius
+        self.cell_size = radius
+        self.cols = self.rows = 0
+        self.layers = {}
+        self.stencil = []
+        self.results = {}
+
+    @staticmethod
+    def resolution(count):
+        # Cells per radius: finer cells thin the ring but add rows to every cell's stencil
+        return 2 if count < 4000 else 3
 
+    def rebuild(self, boids):
+        k = self.resolution(len(boids))
+        cs = self.cell_size = self.radius / k
+        cols = self.cols = int(WIDTH // cs) + 1
+        rows = self.rows = int(HEIGHT // cs) + 1
+        xy = np.array([(b.pos.x, b.pos.y) for b in boids], dtype=np.float64).reshape(-1, 2)
+        color = np.array([COLOR_NAMES.index(b.color_name) for b in boids], dtype=np.int8)
+        inside = (xy[:, 0] >= 0) & (xy[:, 0] < cols * cs) & (xy[:, 1] >= 0) & (xy[:, 1] <= HEIGHT)
+        cell = np.zeros(len(boids), dtype=np.intp)
+        cell[inside] = (xy[inside, 1] // cs).astype(np.intp) * cols + (xy[inside, 0] // cs).astype(np.intp)
 
-particles = []
+        # Per color: boids and points in cell order, the first slot of every cell (plus an
+        # end marker), running sums with a leading zero, and the boids off the grid
+        layers = {}
+        for c, name in enumerate(COLOR_NAMES):
+            mine = color == c
+            order = np.flatnonzero(mine & inside)
+            order = order[np.argsort(cell[order], kind="stable")]
+            pts = xy[order]
+            start = np.searchsorted(cell[order], np.arange(rows * cols + 1)).tolist()
+            sx = np.concatenate(([0.0], np.cumsum(pts[:, 0]))).tolist()
+            sy = np.concatenate(([0.0], np.cumsum(pts[:, 1]))).tolist()
+            off = np.flatnonzero(mine & ~inside)
+            layers[name] = (start, sx, sy, pts, [boids[i] for i in order.tolist()],
+                            xy[off], [boids[i] for i in off.tolist()])
+
+        # For a row offset dy: cells up to inner columns away are wholly inside the circle
+        # from anywhere in the home cell, cells up to reach columns away may be partly inside
+        stencil = []
+        for dy in range(-k, k + 1):
+            fy = abs(dy) + 1
+            ny = max(abs(dy) - 1, 0)
+            inner = math.ceil(math.sqrt(k * k - fy * fy)) - 2 if fy < k else -1
+            reach = math.ceil(math.sqrt(k * k - ny * ny))
+            stencil.append((dy, max(inner, -1), reach))
+
+        self.layers = layers
+        self.stencil = stencil
+        self.results = {}
+
+    def group(self, color_name, cell):
+        # Neighbor sums for every boid of one cell at once
+        cols, rows = self.cols, self.rows
+        gy, gx = divmod(cell, cols)
+        start, run_x, run_y, pts, members, off_pts, _ = self.layers[color_name]
+        sx = sy = count = 0.0
+        ring = [off_pts]
+        for dy, inner, reach in self.stencil:
+            ty = gy + dy
+            if not 0 <= ty < rows:
+                continue
+            base = ty * cols
+            lo = start[base + max(gx - reach, 0)]
+            hi = start[base + min(gx + reach, cols - 1) + 1]
+            if inner >= 0:
+                a = start[base + max(gx - inner, 0)]
+                b = start[base + min(gx + inner, cols - 1) + 1]
+                sx += run_x[b] - run_x[a]
+                sy += run_y[b] - run_y[a]
+                count += b - a
+                ring += (pts[lo:a], pts[b:hi])
+            else:
+                ring.append(pts[lo:hi])
+        i, j = start[cell], start[cell + 1]
+        self.settle(members[i:j], pts[i:j], np.concatenate(ring), (sx, sy, count))
+
+    def settle(self, boids, p, q, base=(0.0, 0.0, 0.0)):
+        # Adds the neighbors in q of each boid to base and stores the result; every boid
+        # finds itself once, in a whole cell or in q, and is taken back out
+        r2 = self.radius * self.radius
+        if len(p) * len(q) < self.SMALL_BATCH:
+            # Too little work to pay for the array calls
+            ring = q.tolist()
+            for b, (x, y) in zip(boids, p.tolist()):
+                sx, sy, count = base
+                for qx, qy in ring:
+                    dx = qx - x
+                    dy = qy - y
+                    if dx * dx + dy * dy < r2:
+                        sx += qx
+                        sy += qy
+                        count += 1
+                self.results[id(b)] = sx - x, sy - y, count - 1
+            return
+        dx = p[:, 0, None] - q[:, 0]
+        dy = p[:, 1, None] - q[:, 1]
+        d2 = dx * dx
+        d2 += dy * dy
+        # 0/1 weights as floats, so the sums below are one BLAS product
+        close = (d2 < r2).astype(np.float64)
+        sums = (close @ q - p + base[:2]).tolist()
+        counts = (close.sum(axis=1) + (base[2] - 1)).tolist()
+        for b, (sx, sy), count in zip(boids, sums, counts):
+            self.results[id(b)] = sx, sy, count
+
+    def neighbor_sums(self, boid):
+        # Sum of positions and count of the same-color boids within the radius, itself excluded
+        result = self.results.get(id(boid))
+        if result is None:
+            x, y = boid.pos.x, boid.pos.y
+            cs = self.cell_size
+            if 0 <= x < self.cols * cs and 0 <= y <= HEIGHT:
+                self.group(boid.color_name, int(y // cs) * self.cols + int(x // cs))
+            else:
+                # Off the grid: test every boid of the color
+                _, _, _, pts, _, off_pts, _ = self.layers[boid.color_name]
+                self.settle([boid], np.array([(x, y)]), np.concatenate((pts, off_pts)))
+            result = self.results[id(boid)]
+        return result
+
+    def query_radius(self, pos, radius):
+        cs = self.cell_size
+        x, y = pos
+        r2 = radius * radius
+        lo = max(int((x - radius) // cs), 0)
+        hi = min(int((x + radius) // cs), self.cols - 1) + 1
+        for start, _, _, _, members, _, off_members in self.layers.values():
+            candidates = list(off_members)
+            for gy in range(max(int((y - radius) // cs), 0), min(int((y + radius) // cs), self.rows - 1) + 1):
+                base = gy * self.cols
+                candidates += members[start[base + lo]:start[base + hi]]
+            for b in candidates:
+                dx = b.pos.x - x
+                dy = b.pos.y - y
+                if dx * dx + dy * dy < r2:
+                    yield b
 
 
 class BoidState:
@@ -83,6 +346,7 @@ class Boid:
             self.pos = pygame.Vector2(pos)
         self.vel = pygame.Vector2(random.uniform(-1, 1), random.uniform(-1, 1))
         self.acc = pygame.Vector2(0, 0)
+        self.cohesion = None
         self.state = BoidState.ATTRACT_COLOR
 
     def set_color(self, name):
@@ -96,19 +360,11 @@ class Boid:
     def apply_force(self, f):
         self.acc += f
 
-    def attraction_color(self, boids):
-        perception = HEIGHT // 4
-        center = pygame.Vector2(0, 0)
-        count = 0
-        for b in boids:
-            if b is self or b.color_name != self.color_name:
-                continue
-            if self.pos.distance_to(b.pos) < perception:
-                center += b.pos
-                count += 1
+    def attraction_color(self, grid):
+        sx, sy, count = grid.neighbor_sums(self)
         if count == 0:
             return pygame.Vector2(0, 0)
-        center /= count
+        center = pygame.Vector2(sx / count, sy / count)
         desired = center - self.pos
         if desired.length() > 0:
             desired.scale_to_length(MAX_SPEED)
@@ -122,45 +378,51 @@ class Boid:
             desired.scale_to_length(MAX_SPEED)
         return limit(desired - self.vel, MAX_FORCE * 1.5)
 
-    def repel_from_mouse(self):
-        mouse = pygame.Vector2(pygame.mouse.get_pos())
+    def repel_from_mouse(self, mouse):
         d = self.pos.distance_to(mouse)
         if d < REPULSION_RADIUS and d > 0:
             force = (self.pos - mouse).normalize() * (REPULSION_RADIUS - d) * REPULSION_FORCE
             self.apply_force(force)
 
     def check_bar_collision(self):
-        future = self.pos + self.vel
+        fx = self.pos.x + self.vel.x
+        if BAR_INNER_LEFT <= fx < BAR_INNER_RIGHT:
+            return
+        fy = self.pos.y + self.vel.y
         for cname, (col, rect) in COLORS.items():
-            if rect.collidepoint(future.x, future.y):
-                if future.x < rect.left:
+            if rect.collidepoint(fx, fy):
+                if fx < rect.left:
                     self.pos.x = rect.left - 2
-                elif future.x > rect.right:
+                elif fx > rect.right:
                     self.pos.x = rect.right + 2
                 self.vel.x *= -1
                 self.change_color()
                 return
 
-    def update_state(self, boids):
+    def update_state(self, mouse):
         self.check_bar_collision()
-        mouse_dist = self.pos.distance_to(pygame.Vector2(pygame.mouse.get_pos()))
+        mouse_dist = self.pos.distance_to(mouse)
         if mouse_dist < REPULSION_RADIUS:
             self.state = BoidState.REPULSE_MOUSE
         else:
             self.state = BoidState.ATTRACT_COLOR
 
-    def update(self):
+    def steer(self, grid, mouse, refresh=True):
+        # On frames without a neighbor refresh the last cohesion force is reused
+        if refresh or self.cohesion is None:
+            self.cohesion = self.attraction_color(grid)
         if self.state == BoidState.ATTRACT_COLOR:
-            self.apply_force(self.attraction_color(boids))
+            self.apply_force(self.cohesion)
             self.apply_force(self.attraction_bar())
         elif self.state == BoidState.REPULSE_MOUSE:
-            self.repel_from_mouse()
-            self.apply_force(self.attraction_color(boids))
+            self.repel_from_mouse(mouse)
+            self.apply_force(self.cohesion)
 
-        self.vel += self.acc
+    def integrate(self, dt=1.0):
+        self.vel += self.acc * dt
         if self.vel.length() > MAX_SPEED:
             self.vel.scale_to_length(MAX_SPEED)
-        self.pos += self.vel
+        self.pos += self.vel * dt
         self.acc *= 0
 
         if self.pos.y < 0:
@@ -170,91 +432,1021 @@ class Boid:
             self.pos.y = HEIGHT
             self.vel.y *= -1
 
-        for _ in range(2):
-            particles.append(Particle(self.pos, self.color))
+    def blit_args(self, glow=True):
+        return boid_sprite(self.color, glow), (int(self.pos.x) - BOID_SPRITE_OFFSET, int(self.pos.y) - BOID_SPRITE_OFFSET)
 
     def draw(self, surf):
-        for size, alpha in [(HALO_RADIUS, 20), (HALO_RADIUS + 1, 8)]:
-            glow = (*self.color, alpha)
-            pygame.draw.circle(surf, glow, (int(self.pos.x), int(self.pos.y)), size)
-        pygame.draw.circle(surf, self.color, (int(self.pos.x), int(self.pos.y)), 1)
-
-    def run(self, boids):
-        self.update_state(boids)
-        self.update()
-        self.draw(screen)
-
-
-boids = [Boid(color) for color in COLOR_NAMES for _ in range(BOIDS_PER_COLOR)]
-
-running = True
-while running:
-    pygame.event.pump()
-    for e in pygame.event.get():
-        if e.type == pygame.QUIT:
-            running = False
-
-        if e.type == pygame.MOUSEBUTTONDOWN:
-            if e.button == 1:
-                mouse_left_down = True
-                mx, my = pygame.mouse.get_pos()
-                mouse_spawn_color = None
-                for cname, (col, rect) in COLORS.items():
-                    if rect.collidepoint(mx, my):
-                        mouse_spawn_color = cname
-                        break
-                if mouse_spawn_color is None:
-                    mouse_kill_active = True
-                else:
-                    mouse_kill_active = False
+        surf.blit(*self.blit_args())
+
 
-            if e.button == 3:
-                mx, my = pygame.mouse.get_pos()
-                for cname, (col, rect) in COLORS.items():
-                    if rect.collidepoint(mx, my):
-                        if len(boids) < MAX_BOIDS:
-                            boids.append(Boid(cname, pos=(WIDTH // 2, HEIGHT // 2)))
+# Struct-of-arrays flock: every boid is a row in contiguous NumPy arrays and each
+# frame is a handful of batch operations instead of one Python call per boid.
+class FlockArrays:
+    def __init__(self, capacity=256, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.vel = np.zeros((capacity, 2), dtype=np.float64)
+        self.color = np.zeros(capacity, dtype=np.int8)
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.cohesion_cache = None
+        self.parallel = None
 
-        if e.type == pygame.MOUSEBUTTONUP:
-            if e.button == 1:
-                mouse_left_down = False
-                mouse_kill_active = False
-                mouse_spawn_color = None
+    def __len__(self):
+        return self.count
 
-    if mouse_left_down and mouse_spawn_color is not None:
-        if len(boids) < MAX_BOIDS:
-            boids.append(Boid(mouse_spawn_color, pos=(WIDTH // 2, HEIGHT // 2)))
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self.pos))
+        for name in ("pos", "vel", "color", "state"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
 
-    screen.fill((40, 60, 90))
+    def add(self, color_name, pos=None):
+        if self.count == len(self.pos):
+            self._grow(self.count + 1)
+        i = self.count
+        if pos is None:
+            pos = (random.randint(100, WIDTH - 100), random.randint(100, HEIGHT - 100))
+        self.pos[i] = pos
+        self.vel[i] = (random.uniform(-1, 1), random.uniform(-1, 1))
+        self.color[i] = COLOR_NAMES.index(color_name)
+        self.state[i] = BoidState.ATTRACT_COLOR
+        self.count += 1
+        self.cohesion_cache = None
+
+    def remove_within(self, center, radius):
+        n = self.count
+        d = self.pos[:n] - center
+        keep = np.einsum("ij,ij->i", d, d) >= radius * radius
+        kept = int(keep.sum())
+        if kept == n:
+            return
+        for arr in (self.pos, self.vel, self.color, self.state):
+            arr[:kept] = arr[:n][keep]
+        self.count = kept
+        self.cohesion_cache = None
+
+    def update_state(self, mouse):
+        n = self.count
+        pos, vel, color = self.pos[:n], self.vel[:n], self.color[:n]
+
+        # Bar collision: first bar hit by the look-ahead position bounces the boid and recolors it
+        # Only boids heading into the left or right bar columns get the full rect test
+        fx = pos[:, 0] + vel[:, 0]
+        edge = np.flatnonzero((fx < BAR_INNER_LEFT) | (fx >= BAR_INNER_RIGHT))
+        fx = fx[edge, None]
+        fy = pos[edge, 1:2] + vel[edge, 1:2]
+        inside = ((fx >= BAR_RECTS[:, 0]) & (fx < BAR_RECTS[:, 2]) &
+                  (fy >= BAR_RECTS[:, 1]) & (fy < BAR_RECTS[:, 3]))
+        hit = edge[inside.any(axis=1)]
+        if len(hit):
+            vel[hit, 0] *= -1
+            shift = self.rng.integers(1, len(COLOR_NAMES), size=len(hit))
+            color[hit] = (color[hit] + shift) % len(COLOR_NAMES)
+
+        d = pos - mouse
+        near = np.einsum("ij,ij->i", d, d) < REPULSION_RADIUS * REPULSION_RADIUS
+        self.state[:n] = np.where(near, BoidState.REPULSE_MOUSE, BoidState.ATTRACT_COLOR)
+
+    def cohesion(self):
+        n = self.count
+        if self.parallel is not None:
+            return self.parallel.cohesion(self.pos[:n], self.vel[:n], self.color[:n])
+        pos, vel, color = self.pos[:n], self.vel[:n], self.color[:n]
+        return cohesion_forces(pos, vel, color, pos, color)
+
+    def forces(self, mouse, refresh=True):
+        n = self.count
+        pos, vel = self.pos[:n], self.vel[:n]
+        repulse = self.state[:n] == BoidState.REPULSE_MOUSE
+        attract = ~repulse
+
+        # add() and remove_within() reshuffle rows and drop the cached cohesion
+        if refresh or self.cohesion_cache is None:
+            self.cohesion_cache = self.cohesion()
+        acc = self.cohesion_cache.copy()
+
+        # attraction_bar
+        if attract.any():
+            target = BAR_CENTERS[self.color[:n][attract]]
+            desired = _scale_rows(target - pos[attract], MAX_SPEED)
+            acc[attract] += _limit_rows(desired - vel[attract], MAX_FORCE * 1.5)
+
+        # repel_from_mouse
+        if repulse.any():
+            away = pos[repulse] - mouse
+            d = np.sqrt(np.einsum("ij,ij->i", away, away))
+            ok = (d > 0) & (d < REPULSION_RADIUS)
+            rows = np.flatnonzero(repulse)[ok]
+            d = d[ok, None]
+            acc[rows] += away[ok] / d * (REPULSION_RADIUS - d) * REPULSION_FORCE
+        return acc
+
+    def integrate(self, acc, dt=1.0):
+        n = self.count
+        pos, vel = self.pos[:n], self.vel[:n]
+        vel += acc * dt
+        vel[:] = _limit_rows(vel, MAX_SPEED)
+        pos += vel * dt
+
+        low = pos[:, 1] < 0
+        high = pos[:, 1] > HEIGHT
+        pos[low, 1] = 0
+        pos[high, 1] = HEIGHT
+        vel[low | high, 1] *= -1
+
+    def emit(self, particles, count=PARTICLES_PER_BOID):
+        n = self.count
+        particles.emit_many(self.pos[:n], COLOR_TABLE[self.color[:n]], count)
+
+    def draw(self, surf, glow=True):
+        n = self.count
+        sprites = [boid_sprite(c, glow) for c in COLOR_RGB]
+        topleft = self.pos[:n].astype(np.int32) - BOID_SPRITE_OFFSET
+        surf.blits([(sprites[c], xy) for c, xy in zip(self.color[:n].tolist(), topleft.tolist())],
+                   doreturn=False)
+
+
+COHESION_CHUNK = 2048
+
+
+# Cohesion steering for the boids in pos/vel/color against the neighbors in nb_pos/nb_color.
+# Neighbors are binned into cells a fraction of PERCEPTION wide and sorted by (color, cell),
+# so a run of cells along a row is one slice, and running sums of x and y give its totals.
+# For every boid and every row its circle touches, the run of cells wholly inside the
+# circle is added from the running sums and only the cells at both ends are tested pair by
+# pair. The neighbor set must contain the boids themselves: they are counted once like any
+# other neighbor and subtracted back out.
+def cohesion_forces(pos, vel, color, nb_pos, nb_color):
+    n = len(pos)
+    steer = np.zeros((n, 2))
+    if n == 0:
+        return steer
+    # Finer cells as the neighbor set gets denser: fewer pairs, more rows per boid
+    k = min(max(round(math.sqrt(len(nb_pos)) / 12), 4), 32)
+    cs = PERCEPTION / k
+    r2 = PERCEPTION * PERCEPTION
+    origin = nb_pos.min(axis=0)
+    cell_x = ((nb_pos[:, 0] - origin[0]) // cs).astype(np.intp)
+    cell_y = ((nb_pos[:, 1] - origin[1]) // cs).astype(np.intp)
+    cols = int(cell_x.max()) + 1
+    rows = int(cell_y.max()) + 1
+    key = nb_color.astype(np.intp) * (rows * cols) + cell_y * cols + cell_x
+    order = np.argsort(key, kind="stable")
+    p = nb_pos[order]
+    px = np.ascontiguousarray(p[:, 0])
+    py = np.ascontiguousarray(p[:, 1])
+    start = np.searchsorted(key[order], np.arange(len(COLOR_NAMES) * rows * cols + 1))
+    run_x = np.concatenate(([0.0], np.cumsum(px)))
+    run_y = np.concatenate(([0.0], np.cumsum(py)))
+
+    center = np.zeros((n, 2))
+    count = np.zeros(n)
+    for lo in range(0, n, COHESION_CHUNK):
+        block = pos[lo:lo + COHESION_CHUNK]
+        m = len(block)
+        x = block[:, 0] - origin[0]
+        y = block[:, 1] - origin[1]
+        color_base = color[lo:lo + COHESION_CHUNK].astype(np.intp) * (rows * cols)
+        home = (y // cs).astype(np.intp)
+        sx = np.zeros(m)
+        sy = np.zeros(m)
+        found = np.zeros(m)
+        owners, firsts, lengths = [], [], []
+        for dy in range(-k - 1, k + 2):
+            ty = home + dy
+            y0 = ty * cs
+            far = np.maximum(np.abs(y - y0), np.abs(y0 + cs - y))
+            near = np.maximum(np.maximum(y0 - y, y - y0 - cs), 0)
+            reach2 = r2 - near * near
+            live = (ty >= 0) & (ty < rows) & (reach2 > 0)
+            reach = np.sqrt(np.where(live, reach2, 0))
+            inner = np.sqrt(np.maximum(r2 - far * far, 0))
+            c_lo = np.clip((x - reach) // cs, 0, cols - 1)
+            c_hi = np.clip((x + reach) // cs, 0, cols - 1) + 1
+            # Cells wholly inside from this boid: [c_a, c_b); none when the row is too far
+            c_a = np.where(far * far < r2, np.floor((x - inner) / cs) + 1, c_hi)
+            c_a = np.clip(c_a, c_lo, c_hi)
+            c_b = np.clip(np.ceil((x + inner) / cs) - 1, c_a, c_hi)
+            row = color_base + np.clip(ty, 0, rows - 1) * cols
+            i_lo = np.where(live, start[row + c_lo.astype(np.intp)], 0)
+            i_a = np.where(live, start[row + c_a.astype(np.intp)], 0)
+            i_b = np.where(live, start[row + c_b.astype(np.intp)], 0)
+            i_hi = np.where(live, start[row + c_hi.astype(np.intp)], 0)
+            sx += run_x[i_b] - run_x[i_a]
+            sy += run_y[i_b] - run_y[i_a]
+            found += i_b - i_a
+            owners += (np.arange(m), np.arange(m))
+            firsts += (i_lo, i_b)
+            lengths += (i_a - i_lo, i_hi - i_b)
+
+        # The two partly covered ends of every row, expanded into (boid, neighbor) pairs
+        lengths = np.concatenate(lengths)
+        owner = np.repeat(np.concatenate(owners), lengths)
+        skip = np.concatenate(firsts) - (np.cumsum(lengths) - lengths)
+        idx = np.arange(len(owner)) + np.repeat(skip, lengths)
+        nx = px[idx]
+        ny = py[idx]
+        dx = nx - block[:, 0][owner]
+        dy = ny - block[:, 1][owner]
+        dx *= dx
+        dy *= dy
+        dx += dy
+        close = dx < r2
+        owner = owner[close]
+        sx += np.bincount(owner, nx[close], minlength=m)
+        sy += np.bincount(owner, ny[close], minlength=m)
+        found += np.bincount(owner, minlength=m)
+        center[lo:lo + m, 0] = sx - block[:, 0]
+        center[lo:lo + m, 1] = sy - block[:, 1]
+        count[lo:lo + m] = found - 1
+
+    has = count > 0
+    if has.any():
+        desired = center[has] / count[has, None] - pos[has]
+        steer[has] = _limit_rows(_scale_rows(desired, MAX_SPEED) - vel[has], MAX_FORCE)
+    return steer
 
-    for name, (col, rect) in COLORS.items():
-        pygame.draw.rect(screen, col, rect)
 
-    mouse_pos = pygame.mouse.get_pos()
-    s = pygame.Surface((REPULSION_RADIUS * 2, REPULSION_RADIUS * 2), pygame.SRCALPHA)
+# Parallel cohesion backend: boids are sorted by x and cut into vertical stripes with the
+# same number of boids each. Every worker process owns one stripe and reads the boids
+# within PERCEPTION of its borders as a halo; all state lives in one shared-memory block,
+# so a tick only sends stripe bounds down the pipes. Bar collisions and color changes
+# stay in the parent, so they follow exactly the serial rules.
+class StripeWorkers:
+    FIELDS = (("pos", np.float64, 2), ("vel", np.float64, 2), ("out", np.float64, 2), ("color", np.int8, 1))
+
+    def __init__(self, workers):
+        ctx = multiprocessing.get_context("spawn")
+        # Workers re-import this script; keep them from printing pygame's banner
+        os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+        self.shm = None
+        self.capacity = 0
+        self.procs = []
+        self.conns = []
+        for _ in range(workers):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_stripe_worker, args=(child, WIDTH, HEIGHT), daemon=True)
+            proc.start()
+            self.procs.append(proc)
+            self.conns.append(parent)
+
+    @staticmethod
+    def layout(capacity):
+        offset = 0
+        for name, dtype, width in StripeWorkers.FIELDS:
+            shape = (capacity, width) if width > 1 else (capacity,)
+            yield name, dtype, shape, offset
+            offset += capacity * width * np.dtype(dtype).itemsize
+
+    def _ensure(self, n):
+        if n <= self.capacity:
+            return
+        capacity = max(n, 2 * self.capacity, 1024)
+        size = sum(capacity * w * np.dtype(d).itemsize for _, d, w in self.FIELDS)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        for name, dtype, shape, offset in self.layout(capacity):
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset))
+        for conn in self.conns:
+            conn.send(("attach", shm.name, capacity))
+        for conn in self.conns:
+            conn.recv()
+        self._release()
+        self.shm = shm
+        self.capacity = capacity
+
+    def _release(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def cohesion(self, pos, vel, color):
+        n = len(pos)
+        self._ensure(n)
+        order = np.argsort(pos[:, 0], kind="stable")
+        self.pos[:n] = pos[order]
+        self.vel[:n] = vel[order]
+        self.color[:n] = color[order]
+        x = self.pos[:n, 0]
+
+        busy = []
+        k = len(self.conns)
+        for i, conn in enumerate(self.conns):
+            a, b = n * i // k, n * (i + 1) // k
+            if a == b:
+                continue
+            ha = int(np.searchsorted(x, x[a] - PERCEPTION, "left"))
+            hb = int(np.searchsorted(x, x[b - 1] + PERCEPTION, "right"))
+            conn.send(("cohesion", a, b, ha, hb))
+            busy.append(conn)
+        for conn in busy:
+            conn.recv()
+
+        out = np.empty((n, 2))
+        out[order] = self.out[:n]
+        return out
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(None)
+        for proc in self.procs:
+            proc.join()
+        self._release()
+        self.procs, self.conns = [], []
+
+
+def _stripe_worker(conn, width, height):
+    configure(width, height)
+    shm = None
+    views = {}
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        if msg[0] == "attach":
+            if shm is not None:
+                shm.close()
+            _, name, capacity = msg
+            shm = shared_memory.SharedMemory(name=name)
+            views = {}
+            for field, dtype, shape, offset in StripeWorkers.layout(capacity):
+                views[field] = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            conn.send(True)
+        elif msg[0] == "cohesion":
+            _, a, b, ha, hb = msg
+            pos, color = views["pos"], views["color"]
+            views["out"][a:b] = cohesion_forces(pos[a:b], views["vel"][a:b], color[a:b],
+                                                pos[ha:hb], color[ha:hb])
+            conn.send(True)
+    views = {}
+    if shm is not None:
+        shm.close()
+
+
+def _scale_rows(v, length):
+    mag = np.sqrt(np.einsum("ij,ij->i", v, v))
+    out = v.copy()
+    nz = mag > 0
+    out[nz] *= (length / mag[nz])[:, None]
+    return out
+
+
+def _limit_rows(v, max_val):
+    mag = np.sqrt(np.einsum("ij,ij->i", v, v))
+    over = mag > max_val
+    out = v.copy()
+    out[over] *= (max_val / mag[over])[:, None]
+    return out
+
+
+# Simulation: one fixed timestep of the whole flock, independent of any window.
+# A tick runs in four phases (state update, forces, integration, particles) and
+# accumulates the wall time spent in each of them into phase_time.
+class Simulation:
+    PHASES = ("state", "forces", "integrate", "particles")
+
+    def __init__(self, engine="objects", boid_count=4 * BOIDS_PER_COLOR, max_boids=None,
+                 max_particles=MAX_PARTICLES, seed=None, workers=0):
+        if seed is not None:
+            random.seed(seed)
+        self.engine = engine
+        self.max_boids = max_boids if max_boids is not None else boid_count + 10
+        self.particles = ParticlePool(max_particles, seed)
+        self.grid = SpatialGrid(PERCEPTION)
+        self.phase_time = dict.fromkeys(self.PHASES, 0.0)
+        self.ticks = 0
+        # Quality knobs, driven by QualityGovernor in the interactive loop
+        self.particles_per_boid = PARTICLES_PER_BOID
+        self.neighbor_interval = 1
+
+        if engine == "numpy":
+            self.boids = FlockArrays(max(self.max_boids, boid_count), seed)
+            for i in range(boid_count):
+                self.boids.add(COLOR_NAMES[i % len(COLOR_NAMES)])
+            if workers:
+                self.boids.parallel = StripeWorkers(workers)
+        else:
+            self.boids = [Boid(COLOR_NAMES[i % len(COLOR_NAMES)]) for i in range(boid_count)]
+
+    def close(self):
+        if self.engine == "numpy" and self.boids.parallel is not None:
+            self.boids.parallel.close()
+            self.boids.parallel = None
+
+    def spawn(self, color_name):
+        if len(self.boids) >= self.max_boids:
+            return
+        if self.engine == "numpy":
+            self.boids.add(color_name, pos=(WIDTH // 2, HEIGHT // 2))
+        else:
+            self.boids.append(Boid(color_name, pos=(WIDTH // 2, HEIGHT // 2)))
+
+    def kill_within(self, pos, radius):
+        if self.engine == "numpy":
+            self.boids.remove_within(pos, radius)
+            return
+        # Radius query on a fresh grid, then one O(N) compaction pass for the whole sweep
+        self.grid.rebuild(self.boids)
+        doomed = {id(b) for b in self.grid.query_radius(pos, radius)}
+        if doomed:
+            self.boids[:] = [b for b in self.boids if id(b) not in doomed]
+
+    # dt is measured in 1/TICK_RATE steps; values above 1 stretch a tick over several frames
+    def tick(self, mouse_pos, kill=False, dt=1.0):
+        clock = time.perf_counter
+        t0 = clock()
+        if kill:
+            self.kill_within(mouse_pos, REPULSION_RADIUS)
+        refresh = self.ticks % self.neighbor_interval == 0
+        emit = self.particles_per_boid
+
+        if self.engine == "numpy":
+            mouse = np.asarray(mouse_pos, dtype=np.float64)
+            self.boids.update_state(mouse)
+            t1 = clock()
+            acc = self.boids.forces(mouse, refresh)
+            t2 = clock()
+            self.boids.integrate(acc, dt)
+            t3 = clock()
+            self.particles.update(dt)
+            if emit:
+                self.boids.emit(self.particles, emit)
+        else:
+            mouse = pygame.Vector2(mouse_pos)
+            for b in self.boids:
+                b.update_state(mouse)
+            t1 = clock()
+            # Boids spawned since the last refresh have no cached cohesion and are missing
+            # from the grid, so they force a rebuild even on a skipped tick
+            if refresh or any(b.cohesion is None for b in self.boids):
+                self.grid.rebuild(self.boids)
+            for b in self.boids:
+                b.steer(self.grid, mouse, refresh)
+            t2 = clock()
+            for b in self.boids:
+                b.integrate(dt)
+            t3 = clock()
+            self.particles.update(dt)
+            if emit:
+                # One batch write for the whole flock instead of one per boid
+                pos = np.array([(b.pos.x, b.pos.y) for b in self.boids], dtype=np.float64).reshape(-1, 2)
+                color = np.array([b.color for b in self.boids], dtype=np.uint8).reshape(-1, 3)
+                self.particles.emit_many(pos, color, emit)
+        t4 = clock()
+
+        pt = self.phase_time
+        pt["state"] += t1 - t0
+        pt["forces"] += t2 - t1
+        pt["integrate"] += t3 - t2
+        pt["particles"] += t4 - t3
+        self.ticks += 1
+
+    def occupied(self):
+        live = self.particles.pos[self.particles.life > 0]
+        if self.engine == "numpy":
+            boids = self.boids.pos[:self.boids.count]
+        else:
+            boids = np.array([(b.pos.x, b.pos.y) for b in self.boids], dtype=np.float64).reshape(-1, 2)
+        return boids, live
+
+    def draw(self, surf, glow=True):
+        self.particles.draw(surf)
+        if self.engine == "numpy":
+            self.boids.draw(surf, glow)
+        else:
+            surf.blits([b.blit_args(glow) for b in self.boids], doreturn=False)
+
+
+# Quality governor for wallpaper mode: watches how long each frame takes to produce and
+# steps quality down when it eats into the frame budget, back up when there is headroom.
+# When the window is hidden or the mouse has been idle it drops to a low-power frame rate.
+class QualityGovernor:
+    # particles per boid, glow layers, neighbor refresh interval, frame rate
+    LEVELS = [
+        (2, True, 1, 60),
+        (1, True, 1, 60),
+        (1, False, 1, 60),
+        (0, False, 2, 60),
+        (0, False, 2, 30),
+    ]
+    DOWN_FRAMES = 30
+    UP_FRAMES = 180
+
+    def __init__(self, sim, level=0, adaptive=True, idle_timeout=60.0, low_power_fps=5):
+        self.sim = sim
+        self.adaptive = adaptive
+        self.idle_timeout = idle_timeout
+        self.low_power_fps = low_power_fps
+        self.avg_ms = 0.0
+        self.over = 0
+        self.under = 0
+        self.occluded = False
+        self.last_mouse = None
+        self.last_mouse_move = time.perf_counter()
+        self.set_level(level)
+
+    def set_level(self, level):
+        self.level = max(0, min(level, len(self.LEVELS) - 1))
+        per_boid, self.glow, interval, self.level_fps = self.LEVELS[self.level]
+        self.sim.particles_per_boid = per_boid
+        self.sim.neighbor_interval = interval
+        self.over = self.under = 0
+
+    @property
+    def low_power(self):
+        idle = self.idle_timeout > 0 and time.perf_counter() - self.last_mouse_move > self.idle_timeout
+        return self.occluded or idle
+
+    @property
+    def fps(self):
+        return self.low_power_fps if self.low_power else self.level_fps
+
+    @property
+    def dt(self):
+        return min(TICK_RATE / self.fps, MAX_DT)
+
+    def handle_event(self, e):
+        if e.type in (pygame.WINDOWHIDDEN, pygame.WINDOWMINIMIZED):
+            self.occluded = True
+        elif e.type in (pygame.WINDOWSHOWN, pygame.WINDOWRESTORED, pygame.WINDOWEXPOSED):
+            self.occluded = False
+
+    def note_mouse(self, pos):
+        if pos != self.last_mouse:
+            self.last_mouse = pos
+            self.last_mouse_move = time.perf_counter()
+
+    def observe(self, work_ms):
+        self.avg_ms = 0.9 * self.avg_ms + 0.1 * work_ms
+        if not self.adaptive or self.low_power:
+            return
+        budget = 1000 / self.level_fps
+        if self.avg_ms > 0.85 * budget:
+            self.over += 1
+            self.under = 0
+            if self.over >= self.DOWN_FRAMES and self.level < len(self.LEVELS) - 1:
+                self.set_level(self.level + 1)
+        elif self.level > 0 and self.avg_ms < 0.5 * 1000 / self.LEVELS[self.level - 1][3]:
+            self.under += 1
+            self.over = 0
+            if self.under >= self.UP_FRAMES:
+                self.set_level(self.level - 1)
+        else:
+            self.over = self.under = 0
+
+
+# Layered renderer: the background and the bars never change, so they are composited
+# once into a cached layer. Every frame only the tiles that sprites covered last frame
+# are restored from it, and only those tiles plus the newly covered ones are pushed
+# with pygame.display.update(rects). "full" mode repaints and flips the whole screen.
+class LayeredRenderer:
+    TILE = 64
+    FULL_FRACTION = 0.6
+    PAD = HALO_RADIUS + 4
+
+    def __init__(self, screen, dirty=True):
+        self.screen = screen
+        self.dirty = dirty
+        w, h = screen.get_size()
+        self.background = pygame.Surface((w, h)).convert()
+        self.background.fill(BG_COLOR)
+        for name, (col, rect) in COLORS.items():
+            pygame.draw.rect(self.background, col, rect)
+        self.tiles = np.zeros(((h + self.TILE - 1) // self.TILE, (w + self.TILE - 1) // self.TILE), dtype=bool)
+        self.erase = []
+        self.full = True
+
+    def invalidate(self):
+        self.full = True
+
+    def begin(self):
+        if not self.dirty or self.full:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            self.screen.blits([(self.background, r, r) for r in self.erase], doreturn=False)
+        self.tiles[:] = False
+
+    def mark_rect(self, rect):
+        rows, cols = self.tiles.shape
+        x0 = max(rect.left // self.TILE, 0)
+        y0 = max(rect.top // self.TILE, 0)
+        x1 = min((rect.right - 1) // self.TILE, cols - 1)
+        y1 = min((rect.bottom - 1) // self.TILE, rows - 1)
+        if x0 <= x1 and y0 <= y1:
+            self.tiles[y0:y1 + 1, x0:x1 + 1] = True
+
+    def mark_points(self, pts, pad=PAD):
+        if not len(pts):
+            return
+        rows, cols = self.tiles.shape
+        # Sprites are smaller than a tile, so each one touches at most a 2x2 block
+        xs = [np.clip((pts[:, 0] + d) // self.TILE, 0, cols - 1).astype(np.intp) for d in (-pad, pad)]
+        ys = [np.clip((pts[:, 1] + d) // self.TILE, 0, rows - 1).astype(np.intp) for d in (-pad, pad)]
+        for tx in xs:
+            for ty in ys:
+                self.tiles[ty, tx] = True
+
+    def _rects(self):
+        # One rect per horizontal run of dirty tiles
+        t = self.TILE
+        rects = []
+        padded = np.zeros((self.tiles.shape[0], self.tiles.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = self.tiles
+        edges = np.diff(padded, axis=1)
+        for y in np.flatnonzero(self.tiles.any(axis=1)):
+            starts = np.flatnonzero(edges[y] == 1)
+            ends = np.flatnonzero(edges[y] == -1)
+            for x0, x1 in zip(starts.tolist(), ends.tolist()):
+                rects.append(pygame.Rect(x0 * t, y * t, (x1 - x0) * t, t).clip(self.screen.get_rect()))
+        return rects
+
+    def present(self):
+        if not self.dirty:
+            pygame.display.flip()
+            return
+        rects = self._rects()
+        if self.full or self.tiles.mean() > self.FULL_FRACTION:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.erase + rects)
+        self.erase = rects
+        self.full = False
+
+
+def draw_scene(screen, renderer, sim, mouse_pos, kill, glow=True):
+    renderer.begin()
+    halo = halo_sprite(HALO_KILL_COLOR if kill else HALO_COLOR)
+    renderer.mark_rect(screen.blit(halo, (mouse_pos[0] - REPULSION_RADIUS, mouse_pos[1] - REPULSION_RADIUS)))
+    sim.draw(screen, glow)
+    for pts in sim.occupied():
+        renderer.mark_points(pts)
+
+
+# Frame profiler: opt-in (--profile) lap timers around each phase of the main loop.
+# The simulation phases come from Simulation.phase_time, so the boid loops themselves
+# pay only a few perf_counter calls per tick.
+class FrameProfiler:
+    WINDOW = 600
+    TRACE_FRAMES = 36000
+    OVERLAY_KEY = pygame.K_F3
+
+    def __init__(self, sim, trace_path=None):
+        self.sim = sim
+        self.trace_path = trace_path
+        self.frame_ms = deque(maxlen=self.WINDOW)
+        self.phase_ms = {}
+        self.trace = deque(maxlen=self.TRACE_FRAMES) if trace_path else None
+        self.frames = 0
+        self.visible = False
+        self.font = None
+
+    def begin(self):
+        self.current = {}
+        self.start = self.last = time.perf_counter()
+        self.sim_before = dict(self.sim.phase_time)
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.current[name] = (now - self.last) * 1000
+        self.last = now
+
+    def end(self):
+        total = (self.last - self.start) * 1000
+        for phase, t in self.sim.phase_time.items():
+            self.current["sim." + phase] = (t - self.sim_before[phase]) * 1000
+        self.frame_ms.append(total)
+        # Exponential moving average keeps the overlay readable
+        for name, ms in self.current.items():
+            self.phase_ms[name] = 0.9 * self.phase_ms.get(name, ms) + 0.1 * ms
+        self.frames += 1
+        if self.trace is not None:
+            self.trace.append({"frame": self.frames, "frame_ms": total,
+                               "boids": len(self.sim.boids), "particles": len(self.sim.particles),
+                               **self.current})
+
+    def percentiles(self):
+        if not self.frame_ms:
+            return 0.0, 0.0, 0.0
+        p50, p95, p99 = np.percentile(np.fromiter(self.frame_ms, dtype=np.float64), (50, 95, 99))
+        return p50, p95, p99
+
+    def draw(self, surf, fps):
+        if self.font is None:
+            self.font = pygame.font.SysFont(None, 22)
+        p50, p95, p99 = self.percentiles()
+        lines = [f"{fps:5.1f} fps   p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f} ms",
+                 f"boids {len(self.sim.boids)}   particles {len(self.sim.particles)}"]
+        lines += [f"{name:<16}{ms:7.2f} ms" for name, ms in self.phase_ms.items()]
+
+        graph_h = 60
+        width = 300
+        height = 10 + 18 * len(lines) + graph_h + 10
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for i, line in enumerate(lines):
+            panel.blit(self.font.render(line, True, (230, 230, 230)), (10, 10 + 18 * i))
+
+        # Last frames as bars, scaled so the 60 FPS budget sits at mid height
+        budget = 1000 / 60
+        base = height - 10
+        recent = list(self.frame_ms)[-(width - 20):]
+        for x, ms in enumerate(recent):
+            h = min(graph_h, int(ms / budget * graph_h / 2))
+            col = (90, 220, 90) if ms <= budget else (240, 80, 60)
+            pygame.draw.line(panel, col, (10 + x, base), (10 + x, base - h))
+        pygame.draw.line(panel, (200, 200, 200), (10, base - graph_h // 2), (width - 10, base - graph_h // 2))
+        return surf.blit(panel, (WIDTH - width - BAR_WIDTH - 10, 10))
+
+    def dump(self):
+        if not self.trace_path or not self.trace:
+            return
+        rows = list(self.trace)
+        if self.trace_path.endswith(".csv"):
+            fields = list(dict.fromkeys(k for row in rows for k in row))
+            with open(self.trace_path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            p50, p95, p99 = self.percentiles()
+            with open(self.trace_path, "w") as f:
+                json.dump({"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "frames": rows}, f)
+
+
+# Headless benchmark
+def scripted_mouse(path, t):
+    if path == "orbit":
+        return (WIDTH / 2 + WIDTH / 3 * math.cos(0.7 * t),
+                HEIGHT / 2 + HEIGHT / 3 * math.sin(1.1 * t))
+    if path == "sweep":
+        return ((0.25 * t) % 1.0 * WIDTH, HEIGHT / 2)
+    # "none": park the cursor far outside the repulsion range
+    return (-10 * REPULSION_RADIUS, -10 * REPULSION_RADIUS)
+
+
+def run_headless(args):
+    configure(args.width, args.height)
+    boid_count = args.boids if args.boids is not None else 4 * args.boids_per_color
+    sim = Simulation(args.engine, boid_count, args.max_boids, args.max_particles, args.seed, args.workers)
+
+    dt = 1.0 / TICK_RATE
+    start = time.perf_counter()
+    for i in range(args.ticks):
+        sim.tick(scripted_mouse(args.mouse_path, i * dt))
+    elapsed = time.perf_counter() - start
+    sim.close()
+
+    report = {
+        "engine": args.engine,
+        "workers": args.workers,
+        "boids": boid_count,
+        "final_boids": len(sim.boids),
+        "final_particles": len(sim.particles),
+        "ticks": args.ticks,
+        "seed": args.seed,
+        "width": WIDTH,
+        "height": HEIGHT,
+        "mouse_path": args.mouse_path,
+        "elapsed_s": elapsed,
+        "ticks_per_s": args.ticks / elapsed if elapsed > 0 else float("inf"),
+        "phase_ms_per_tick": {k: 1000 * v / max(args.ticks, 1) for k, v in sim.phase_time.items()},
+    }
+
+    print(f"{args.engine}: {boid_count} boids, {args.ticks} ticks in {elapsed:.3f}s "
+          f"({report['ticks_per_s']:.1f} ticks/s)")
+    for phase, ms in report["phase_ms_per_tick"].items():
+        print(f"  {phase:<10} {ms:8.3f} ms/tick")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+# Ticks per second of the numpy engine with the serial path and with 1..N stripe workers
+def run_scaling_bench(args):
+    configure(args.width, args.height)
+    boid_count = args.boids if args.boids is not None else 4 * args.boids_per_color
+    max_workers = args.workers or os.cpu_count() or 1
+    results = []
+    for workers in range(0, max_workers + 1):
+        sim = Simulation("numpy", boid_count, None, args.max_particles, args.seed, workers)
+        sim.tick(scripted_mouse(args.mouse_path, 0.0))  # warm-up: worker start-up and shared memory
+        start = time.perf_counter()
+        for i in range(1, args.ticks + 1):
+            sim.tick(scripted_mouse(args.mouse_path, i / TICK_RATE))
+        elapsed = time.perf_counter() - start
+        sim.close()
+        tps = args.ticks / elapsed
+        results.append({"workers": workers, "ticks_per_s": tps, "speedup": tps / results[0]["ticks_per_s"] if results else 1.0})
+        label = "serial" if workers == 0 else f"{workers} workers"
+        print(f"{label:<11} {tps:8.1f} ticks/s   x{results[-1]['speedup']:.2f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"boids": boid_count, "ticks": args.ticks, "seed": args.seed, "results": results}, f, indent=2)
+    return results
+
+
+RENDER_BENCH_SIZES = ((1920, 1080), (2560, 1440), (3840, 2160))
+
+
+# Dirty-rectangle vs full-flip throughput at common wallpaper resolutions.
+# Set SDL_VIDEODRIVER=dummy to run it on a machine without a display.
+def run_render_bench(args):
+    pygame.init()
+    boid_count = args.boids if args.boids is not None else 4 * args.boids_per_color
+    results = []
+    for w, h in RENDER_BENCH_SIZES:
+        configure(w, h)
+        screen = pygame.display.set_mode((w, h), pygame.NOFRAME)
+        build_sprites()
+        for mode in ("full", "dirty"):
+            sim = Simulation(args.engine, boid_count, None, args.max_particles, args.seed)
+            renderer = LayeredRenderer(screen, dirty=mode == "dirty")
+            render_s = 0.0
+            start = time.perf_counter()
+            for i in range(args.ticks):
+                mouse = scripted_mouse(args.mouse_path, i / TICK_RATE)
+                sim.tick(mouse)
+                t0 = time.perf_counter()
+                draw_scene(screen, renderer, sim, mouse, False)
+                renderer.present()
+                render_s += time.perf_counter() - t0
+            total_s = time.perf_counter() - start
+            results.append({"width": w, "height": h, "mode": mode, "frames": args.ticks,
+                            "render_fps": args.ticks / render_s, "total_fps": args.ticks / total_s})
+            print(f"{w}x{h} {mode:<5}  render {results[-1]['render_fps']:8.1f} fps   "
+                  f"total {results[-1]['total_fps']:7.1f} fps")
+    pygame.quit()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"engine": args.engine, "boids": boid_count, "seed": args.seed, "results": results}, f, indent=2)
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Boids + State Machine")
+    parser.add_argument("--boids-per-color", type=int, default=BOIDS_PER_COLOR)
+    parser.add_argument("--max-boids", type=int, default=None,
+                        help="hard cap on live boids (default: initial boids + 10)")
+    parser.add_argument("--engine", choices=("objects", "numpy"), default="objects",
+                        help="objects: one Boid instance per boid; numpy: struct-of-arrays batch engine")
+    parser.add_argument("--max-particles", type=int, default=MAX_PARTICLES,
+                        help="particle pool capacity; the oldest particles are recycled past this cap")
+    parser.add_argument("--seed", type=int, default=None)
+
+    parser.add_argument("--workers", type=int, default=0,
+                        help="numpy engine: compute cohesion in N worker processes over shared memory")
+    parser.add_argument("--render", choices=("dirty", "full"), default="dirty",
+                        help="dirty: redraw and push only the regions sprites touched; full: flip the whole screen")
+    parser.add_argument("--quality", default="auto", choices=("auto", "0", "1", "2", "3", "4"),
+                        help="auto: adapt to the measured frame time; 0-4: fixed quality level (0 = full)")
+    parser.add_argument("--idle-timeout", type=float, default=60.0,
+                        help="seconds without mouse movement before low-power mode (0 disables)")
+    parser.add_argument("--low-power-fps", type=int, default=5)
+    parser.add_argument("--profile", action="store_true",
+                        help="time each phase of the main loop; F3 toggles the overlay")
+    parser.add_argument("--profile-out", default=None,
+                        help="with --profile, save the per-frame trace on exit (.csv or .json)")
+
+    bench = parser.add_argument_group("headless benchmark")
+    bench.add_argument("--headless", action="store_true",
+                       help="run a fixed number of simulation ticks without opening a window")
+    bench.add_argument("--render-bench", action="store_true",
+                       help="compare dirty-rect and full-flip rendering at 1080p, 1440p and 4K")
+    bench.add_argument("--scaling-bench", action="store_true",
+                       help="numpy engine ticks/s with the serial path and 1..--workers processes")
+    bench.add_argument("--ticks", type=int, default=600)
+    bench.add_argument("--boids", type=int, default=None,
+                       help="total initial boid count (overrides --boids-per-color)")
+    bench.add_argument("--width", type=int, default=1920)
+    bench.add_argument("--height", type=int, default=1080)
+    bench.add_argument("--mouse-path", choices=("orbit", "sweep", "none"), default="orbit")
+    bench.add_argument("--output", default=None, help="write the benchmark report to this JSON file")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.workers and args.engine != "numpy" and not args.scaling_bench:
+        parser.error("--workers requires --engine numpy")
+    if args.scaling_bench:
+        run_scaling_bench(args)
+        return
+    if args.headless:
+        run_headless(args)
+        return
+    if args.render_bench:
+        run_render_bench(args)
+        return
+
+    pygame.init()
+
+    info = pygame.display.Info()
+    configure(info.current_w, info.current_h)
+
+    screen = pygame.display.set_mode(
+        (WIDTH, HEIGHT),
+        pygame.NOFRAME
+    )
+
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.KEYDOWN,
+                              pygame.WINDOWHIDDEN, pygame.WINDOWSHOWN, pygame.WINDOWMINIMIZED,
+                              pygame.WINDOWRESTORED, pygame.WINDOWEXPOSED])
+
+    clock = pygame.time.Clock()
+    build_sprites()
+    renderer = LayeredRenderer(screen, dirty=args.render == "dirty")
+
+    boid_count = args.boids if args.boids is not None else 4 * args.boids_per_color
+    sim = Simulation(args.engine, boid_count, args.max_boids, args.max_particles, args.seed, args.workers)
+    profiler = FrameProfiler(sim, args.profile_out) if args.profile else None
+    adaptive = args.quality == "auto"
+    governor = QualityGovernor(sim, 0 if adaptive else int(args.quality), adaptive,
+                               args.idle_timeout, args.low_power_fps)
+
+    mouse_kill_active = False
+    mouse_left_down = False
+    mouse_spawn_color = None
+
+    running = True
+    while running:
+        frame_start = time.perf_counter()
+        if profiler:
+            profiler.begin()
+        pygame.event.pump()
+        for e in pygame.event.get():
+            if e.type == pygame.QUIT:
+                running = False
+
+            governor.handle_event(e)
+            if e.type == pygame.WINDOWEXPOSED:
+                renderer.invalidate()
+
+            if e.type == pygame.KEYDOWN and profiler and e.key == FrameProfiler.OVERLAY_KEY:
+                profiler.visible = not profiler.visible
+
+            if e.type == pygame.MOUSEBUTTONDOWN:
+                if e.button == 1:
+                    mouse_left_down = True
+                    mx, my = e.pos
+                    mouse_spawn_color = None
+                    for cname, (col, rect) in COLORS.items():
+                        if rect.collidepoint(mx, my):
+                            mouse_spawn_color = cname
+                            break
+                    if mouse_spawn_color is None:
+                        mouse_kill_active = True
+                    else:
+                        mouse_kill_active = False
+
+                if e.button == 3:
+                    mx, my = e.pos
+                    for cname, (col, rect) in COLORS.items():
+                        if rect.collidepoint(mx, my):
+                            sim.spawn(cname)
+
+            if e.type == pygame.MOUSEBUTTONUP:
+                if e.button == 1:
+                    mouse_left_down = False
+                    mouse_kill_active = False
+                    mouse_spawn_color = None
 
-    for i in range(REPULSION_RADIUS, 0, -1):
-        alpha = int(50 * (i / REPULSION_RADIUS))
-        color = (150, 100, 255, alpha) if not mouse_kill_active else (255, 60, 60, alpha)
-        pygame.draw.circle(s, color, (REPULSION_RADIUS, REPULSION_RADIUS), i)
+        if mouse_left_down and mouse_spawn_color is not None:
+            sim.spawn(mouse_spawn_color)
 
-    screen.blit(s, (mouse_pos[0] - REPULSION_RADIUS, mouse_pos[1] - REPULSION_RADIUS))
+        mouse_pos = pygame.mouse.get_pos()
+        governor.note_mouse(mouse_pos)
+        if profiler:
+            profiler.lap("events")
+        sim.tick(mouse_pos, kill=mouse_kill_active, dt=governor.dt)
+        if profiler:
+            profiler.lap("tick")
 
-    if mouse_kill_active:
-        for b in boids[:]:
-            if b.pos.distance_to(pygame.Vector2(mouse_pos)) < REPULSION_RADIUS:
-                boids.remove(b)
+        draw_scene(screen, renderer, sim, mouse_pos, mouse_kill_active, governor.glow)
+        if profiler:
+            profiler.lap("draw")
+            if profiler.visible:
+                renderer.mark_rect(profiler.draw(screen, clock.get_fps()))
+                profiler.lap("overlay")
 
-    for p in particles[:]:
-        p.update()
-        p.draw(screen)
-        if p.life <= 0:
-            particles.remove(p)
+        renderer.present()
+        if profiler:
+            profiler.lap("flip")
+            profiler.end()
+        governor.observe((time.perf_counter() - frame_start) * 1000)
+        clock.tick(governor.fps)
 
-    for b in boids:
-        b.run(boids)
+    if profiler:
+        profiler.dump()
+    sim.close()
+    pygame.quit()
 
-    pygame.display.flip()
-    clock.tick(60)
 
-pygame.quit()
\ No newline at end of file
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
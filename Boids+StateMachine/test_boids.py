@@ -0,0 +1,35 @@
+import importlib.util
+import os
+
+import numpy as np
+
+# The script name is not a valid module name, so load it from its path
+_spec = importlib.util.spec_from_file_location(
+    "boids", os.path.join(os.path.dirname(__file__), "Boids+StateMachine.py"))
+boids = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(boids)
+
+
+def test_spawn_on_skipped_neighbor_refresh():
+    sim = boids.Simulation("objects", 40, seed=1)
+    sim.neighbor_interval = 2
+    sim.tick((0, 0))
+    # Tick 1 skips the refresh; the new boid has no cached cohesion yet
+    sim.spawn("red")
+    sim.tick((0, 0))
+    assert sim.ticks == 2
+    assert all(b.cohesion is not None for b in sim.boids)
+
+
+def test_numpy_kill_and_spawn_on_skipped_refresh():
+    sim = boids.Simulation("numpy", 40, seed=1)
+    sim.neighbor_interval = 2
+    sim.tick((0, 0))
+    # One kill and one spawn keep the row count but move boids to other rows
+    n = len(sim.boids)
+    sim.boids.remove_within(tuple(sim.boids.pos[0]), 1e-6)
+    sim.spawn("red")
+    assert len(sim.boids) == n
+    expected = sim.boids.cohesion()
+    sim.tick((0, 0))
+    assert np.allclose(sim.boids.cohesion_cache, expected)
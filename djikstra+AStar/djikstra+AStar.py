@@ -1,9 +1,24 @@
 import pygame
+import numpy as np
 import random
 import heapq
 import sys
+import os
 import time
-from collections import deque
+import mmap
+import struct
+import zlib
+import argparse
+import multiprocessing
+import csv
+import json
+import weakref
+import statistics
+import tracemalloc
+from array import array
+from collections import deque, OrderedDict
+from operator import sub
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # Configuration
 CELL_SIZE = 24
@@ -23,6 +38,9 @@ COLOR_OPEN = (100, 180, 250)
 COLOR_CLOSED = (90, 90, 200)
 COLOR_PATH = (240, 200, 65)
 COLOR_HIGHLIGHT = (160, 160, 160)
+# Distance heatmap: color at each fraction of the largest distance
+HEATMAP_STOPS = (0.0, 0.5, 1.0)
+HEATMAP_COLORS = ((20, 30, 120), (200, 60, 120), (250, 230, 80))
 
 TOP = 1
 RIGHT = 2
@@ -31,12 +49,188 @@ LEFT = 8
 DIR_VECTORS = {TOP: (0, -1), RIGHT: (1, 0), BOTTOM: (0, 1), LEFT: (-1, 0)}
 OPPOSITE = {TOP: BOTTOM, RIGHT: LEFT, BOTTOM: TOP, LEFT: RIGHT}
 
+# Eller's algorithm, one row at a time in O(cols) memory. Each yielded bytearray is a
+# finished row of wall masks, so huge mazes can be streamed straight to disk.
+def eller_rows(cols, rows, seed=None):
+    rng = random.Random(seed)
+    sets = list(range(cols))
+    row = bytearray(cols)
+
+    def find(parent, a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for y in range(rows):
+        parent = list(range(cols))
+        last = y == rows - 1
+        for x in range(cols - 1):
+            a, b = find(parent, sets[x]), find(parent, sets[x + 1])
+            if a != b and (last or rng.random() < 0.5):
+                row[x] |= RIGHT
+                row[x + 1] |= LEFT
+                parent[b] = a
+        if last:
+            yield row
+            return
+
+        # Every set needs at least one passage down into the next row
+        members = {}
+        for x in range(cols):
+            members.setdefault(find(parent, sets[x]), []).append(x)
+        below = bytearray(cols)
+        labels = {}
+        next_sets = [-1] * cols
+        for root, xs in members.items():
+            forced = rng.choice(xs)
+            for x in xs:
+                if x == forced or rng.random() < 0.5:
+                    row[x] |= BOTTOM
+                    below[x] = TOP
+                    next_sets[x] = labels.setdefault(root, len(labels))
+        fresh = len(labels)
+        for x in range(cols):
+            if next_sets[x] < 0:
+                next_sets[x] = fresh
+                fresh += 1
+        yield row
+        sets = next_sets
+        row = below
+
+
+# Maze files
+# A 40-byte header (magic, version, cols, rows, seed or -1, generator name) followed by
+# the wall masks packed two cells per byte, even cells in the low nibble. Maze.load maps
+# the file and reads cells straight from the mapping through PackedGrid, so opening is
+# instant whatever the size, and read-only mappings share one page cache across processes.
+MAZE_HEADER = struct.Struct("<4sHHIIq16s")
+MAZE_MAGIC = b"MAZ1"
+
+
+class PackedGrid:
+    # Indexes like the bytearray grid of an in-memory Maze, over 4-bit packed cells
+    def __init__(self, data, n, mapping=None):
+        self.data = data
+        self.n = n
+        self.mapping = mapping
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if i & 1:
+            return self.data[i >> 1] >> 4
+        return self.data[i >> 1] & 15
+
+    def __setitem__(self, i, mask):
+        b = self.data[i >> 1]
+        self.data[i >> 1] = (b & 15) | (mask << 4) if i & 1 else (b & 0xF0) | mask
+
+    def __bytes__(self):
+        packed = np.frombuffer(self.data, dtype=np.uint8)
+        cells = np.empty(2 * len(packed), dtype=np.uint8)
+        cells[0::2] = packed & 15
+        cells[1::2] = packed >> 4
+        return cells[:self.n].tobytes()
+
+    def close(self):
+        if self.mapping is not None:
+            self.data.release()
+            self.mapping.close()
+            self.mapping = None
+
+
+def write_maze_rows(path, cols, rows, row_iter, seed=None, generator=""):
+    # Packs rows of wall masks into a maze file as they come, so a maze never has to fit in
+    # memory (see eller_rows). Rows of odd width straddle bytes: the spare nibble carries over.
+    carry = None
+    with open(path, "wb") as f:
+        f.write(MAZE_HEADER.pack(MAZE_MAGIC, 1, 0, cols, rows, -1 if seed is None else seed,
+                                 generator.encode("ascii")))
+        for row in row_iter:
+            cells = np.frombuffer(bytes(row), dtype=np.uint8)
+            if carry is not None:
+                cells = np.concatenate(([carry], cells))
+                carry = None
+            if len(cells) & 1:
+                carry = int(cells[-1])
+                cells = cells[:-1]
+            f.write((cells[0::2] | (cells[1::2] << 4)).astype(np.uint8).tobytes())
+        if carry is not None:
+            f.write(bytes([carry]))
+
+
+# Number of passages for each 4-bit wall mask
+DEGREE = bytes(bin(mask).count("1") for mask in range(16))
+
+# Pathfinder cell flags
+OPEN = 1
+CLOSED = 2
+INF = 2 ** 31 - 1
+
 # Maze
 class Maze:
-    def __init__(self, cols, rows):
+    def __init__(self, cols, rows, grid=None):
         self.cols = cols
         self.rows = rows
-        self.grid = [0] * (cols * rows)
+        # One byte per cell: the TOP/RIGHT/BOTTOM/LEFT passage bits (a PackedGrid when loaded)
+        self.grid = bytearray(cols * rows) if grid is None else grid
+        # Recorded by generate() and saved in maze files
+        self.seed = None
+        self.generator = ""
+        # Per-maze precomputations (corridor graph, landmark tables), dropped whenever a
+        # wall changes
+        self.cache = {}
+        # Bumped on every wall change, so results computed on an older layout can be told apart
+        self.version = 0
+        # Weak references to the callables subscribe() registered; each is called as
+        # listener(i, j) with the flat indices on both sides of a changed wall
+        self.listeners = []
+
+    @classmethod
+    def from_bytes(cls, cols, rows, data):
+        if len(data) != cols * rows:
+            raise ValueError(f"expected {cols * rows} bytes for a {cols}x{rows} maze, got {len(data)}")
+        return cls(cols, rows, bytearray(data))
+
+    def to_bytes(self):
+        return bytes(self.grid)
+
+    def checksum(self):
+        return zlib.crc32(self.to_bytes())
+
+    def mask_array(self):
+        # Flat uint8 NumPy view of the wall masks (a copy for packed grids)
+        if isinstance(self.grid, bytearray):
+            return np.frombuffer(self.grid, dtype=np.uint8)
+        return np.frombuffer(bytes(self.grid), dtype=np.uint8)
+
+    def save(self, path):
+        write_maze_rows(path, self.cols, self.rows, [self.to_bytes()], self.seed, self.generator)
+
+    @classmethod
+    def load(cls, path, writable=False):
+        with open(path, "r+b" if writable else "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        if mapping.size() < MAZE_HEADER.size:
+            mapping.close()
+            raise ValueError(f"{path}: not a maze file")
+        magic, version, _, cols, rows, seed, generator = MAZE_HEADER.unpack_from(mapping)
+        size = MAZE_HEADER.size + (cols * rows + 1) // 2
+        if magic != MAZE_MAGIC or version != 1 or mapping.size() != size:
+            mapping.close()
+            raise ValueError(f"{path}: not a maze file or truncated")
+        data = memoryview(mapping)[MAZE_HEADER.size:]
+        maze = cls(cols, rows, PackedGrid(data, cols * rows, mapping))
+        maze.seed = None if seed < 0 else seed
+        maze.generator = generator.rstrip(b"\0").decode("ascii")
+        return maze
+
+    def close(self):
+        self.release_cache()
+        if isinstance(self.grid, PackedGrid):
+            self.grid.close()
 
     def in_bounds(self, x, y):
         return 0 <= x < self.cols and 0 <= y < self.rows
@@ -48,17 +242,60 @@ class Maze:
         return self.grid[self.idx(x, y)]
 
     def set(self, x, y, mask):
-        self.grid[self.idx(x, y)] = mask
+        i = self.idx(x, y)
+        changed = self.grid[i] ^ mask
+        self.grid[i] = mask
+        self.invalidate()
+        for d, (dx, dy) in DIR_VECTORS.items():
+            if changed & d and self.in_bounds(x + dx, y + dy):
+                self.notify(i, self.idx(x + dx, y + dy))
 
     def carve(self, x, y, direction):
         nx = x + DIR_VECTORS[direction][0]
         ny = y + DIR_VECTORS[direction][1]
         if not self.in_bounds(nx, ny):
             return False
-        self.grid[self.idx(x, y)] |= direction
-        self.grid[self.idx(nx, ny)] |= OPPOSITE[direction]
+        i, j = self.idx(x, y), self.idx(nx, ny)
+        if self.grid[i] & direction and self.grid[j] & OPPOSITE[direction]:
+            return True
+        self.grid[i] |= direction
+        self.grid[j] |= OPPOSITE[direction]
+        self.invalidate()
+        self.notify(i, j)
         return True
 
+    def add_wall(self, x, y, direction):
+        # Inverse of carve: closes the passage on both sides
+        nx = x + DIR_VECTORS[direction][0]
+        ny = y + DIR_VECTORS[direction][1]
+        if not self.in_bounds(nx, ny):
+            return False
+        i, j = self.idx(x, y), self.idx(nx, ny)
+        if not (self.grid[i] & direction or self.grid[j] & OPPOSITE[direction]):
+            return True
+        self.grid[i] &= ~direction
+        self.grid[j] &= ~OPPOSITE[direction]
+        self.invalidate()
+        self.notify(i, j)
+        return True
+
+    def subscribe(self, listener):
+        # Held weakly, so a discarded search stops hearing about walls and can be freed
+        # without unsubscribing
+        ref = weakref.WeakMethod(listener) if hasattr(listener, "__self__") else weakref.ref(listener)
+        self.listeners = [old for old in self.listeners if old() is not None]
+        self.listeners.append(ref)
+
+    def unsubscribe(self, listener):
+        self.listeners = [ref for ref in self.listeners if ref() not in (None, listener)]
+
+    def notify(self, i, j):
+        for ref in list(self.listeners):
+            listener = ref()
+            if listener is not None:
+                listener(i, j)
+        self.listeners = [ref for ref in self.listeners if ref() is not None]
+
     def neighbors_coords(self, x, y):
         for d, v in DIR_VECTORS.items():
             nx = x + v[0]
@@ -66,29 +303,103 @@ class Maze:
             if self.in_bounds(nx, ny):
                 yield nx, ny, d
 
+    # Generators
+    # All of them are seeded and produce perfect mazes (exactly one path between two cells).
+    def generate(self, name, seed=None):
+        GENERATORS[name](self, seed)
+        self.seed = seed
+        self.generator = name
+        self.invalidate()
+
     def generate_recursive_backtracker(self, seed=None):
         rng = random.Random(seed)
-        self.grid = [0] * (self.cols * self.rows)
-        stack = []
-        sx = rng.randrange(0, self.cols)
-        sy = rng.randrange(0, self.rows)
-        stack.append((sx, sy))
-        visited = set()
-        visited.add((sx, sy))
+        cols, rows = self.cols, self.rows
+        grid = bytearray(cols * rows)
+        visited = bytearray(cols * rows)
+        sx = rng.randrange(0, cols)
+        sy = rng.randrange(0, rows)
+        start = sy * cols + sx
+        visited[start] = 1
+        stack = [start]
 
         while stack:
-            x, y = stack[-1]
+            i = stack[-1]
+            y, x = divmod(i, cols)
+            # Same TOP, RIGHT, BOTTOM, LEFT order as DIR_VECTORS, so a seed gives the same maze
             unvisited = []
-            for nx, ny, d in self.neighbors_coords(x, y):
-                if (nx, ny) not in visited:
-                    unvisited.append((nx, ny, d))
+            if y > 0 and not visited[i - cols]:
+                unvisited.append((i - cols, TOP))
+            if x < cols - 1 and not visited[i + 1]:
+                unvisited.append((i + 1, RIGHT))
+            if y < rows - 1 and not visited[i + cols]:
+                unvisited.append((i + cols, BOTTOM))
+            if x > 0 and not visited[i - 1]:
+                unvisited.append((i - 1, LEFT))
             if unvisited:
-                nx, ny, d = rng.choice(unvisited)
-                self.carve(x, y, d)
-                visited.add((nx, ny))
-                stack.append((nx, ny))
+                j, d = rng.choice(unvisited)
+                grid[i] |= d
+                grid[j] |= OPPOSITE[d]
+                visited[j] = 1
+                stack.append(j)
             else:
                 stack.pop()
+        self.grid = grid
+
+    def generate_eller(self, seed=None):
+        grid = bytearray()
+        for row in eller_rows(self.cols, self.rows, seed):
+            grid += row
+        self.grid = grid
+
+    def generate_kruskal(self, seed=None):
+        rng = random.Random(seed)
+        cols, rows = self.cols, self.rows
+        n = cols * rows
+        grid = bytearray(n)
+        # Edge e joins cell e >> 1 to its right (e & 1 == 0) or bottom (e & 1 == 1) neighbor
+        edges = array('q', (e for i in range(n) for e in (2 * i, 2 * i + 1)
+                            if (e & 1 and i + cols < n) or (not e & 1 and i % cols < cols - 1)))
+        rng.shuffle(edges)
+        parent = array('i', range(n))
+
+        def find(a):
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            return a
+
+        joined = 0
+        for e in edges:
+            i = e >> 1
+            if e & 1:
+                j, d = i + cols, BOTTOM
+            else:
+                j, d = i + 1, RIGHT
+            a, b = find(i), find(j)
+            if a != b:
+                parent[b] = a
+                grid[i] |= d
+                grid[j] |= OPPOSITE[d]
+                joined += 1
+                if joined == n - 1:
+                    break
+        self.grid = grid
+
+    def generate_binary_tree(self, seed=None):
+        # Every cell opens either right or down, so the whole maze is a few array operations
+        rng = np.random.default_rng(seed)
+        cols, rows = self.cols, self.rows
+        right = rng.random((rows, cols)) < 0.5
+        right[-1, :] = True
+        right[:, -1] = False
+        down = ~right
+        down[-1, :] = False
+        cells = np.zeros((rows, cols), dtype=np.uint8)
+        cells[right] |= RIGHT
+        cells[:, 1:][right[:, :-1]] |= LEFT
+        cells[down] |= BOTTOM
+        cells[1:, :][down[:-1, :]] |= TOP
+        self.grid = bytearray(cells.tobytes())
 
     def passages_from(self, x, y):
         mask = self.get(x, y)
@@ -98,255 +409,2079 @@ class Maze:
                 ny = y + vec[1]
                 yield nx, ny
 
+    def index_offsets(self):
+        # Flat-index step for each passage bit
+        return [(TOP, -self.cols), (RIGHT, 1), (BOTTOM, self.cols), (LEFT, -1)]
 
+    def move_table(self):
+        # Flat-index steps open from each of the 16 wall masks, so a search decodes a
+        # cell's neighbors with one lookup instead of testing the four bits
+        if "moves" not in self.cache:
+            offsets = self.index_offsets()
+            self.cache["moves"] = tuple(tuple(offset for bit, offset in offsets if mask & bit)
+                                        for mask in range(16))
+        return self.cache["moves"]
+
+    def release_cache(self):
+        # Landmark tables loaded from a file keep it mapped until they are closed
+        for value in self.cache.values():
+            if isinstance(value, Landmarks):
+                value.close()
+        self.cache.clear()
+
+    def invalidate(self):
+        self.release_cache()
+        self.version += 1
+
+    def corridors(self):
+        if "corridors" not in self.cache:
+            self.cache["corridors"] = CorridorGraph(self)
+        return self.cache["corridors"]
+
+    def landmarks(self, k=8, directory=None):
+        # With a directory, tables are loaded from it when saved for this maze, else built
+        # and saved there
+        key = ("landmarks", k)
+        if key not in self.cache:
+            landmarks = None
+            path = os.path.join(directory, Landmarks.filename(self, k)) if directory else None
+            if path and os.path.exists(path):
+                try:
+                    landmarks = Landmarks.load(path, self)
+                except ValueError:
+                    landmarks = None
+            if landmarks is None:
+                landmarks = Landmarks(self, k)
+                if path:
+                    landmarks.save(path)
+            self.cache[key] = landmarks
+        return self.cache[key]
+
+
+GENERATORS = {
+    "backtracker": Maze.generate_recursive_backtracker,
+    "eller": Maze.generate_eller,
+    "kruskal": Maze.generate_kruskal,
+    "binary-tree": Maze.generate_binary_tree,
+}
+
+
+# Chunked world
+# An unbounded maze cut into chunk x chunk tiles. A tile is built on first access by one of
+# the GENERATORS, seeded from (seed, cx, cy), so it comes back identical after eviction.
+# Each chunk is a perfect maze on its own; the seam between two neighbors gets a few
+# openings chosen from (seed, seam) alone, so both sides agree without either one being
+# loaded, and the whole world is connected. Tiles live in an LRU bounded by max_bytes.
+# Coordinates are unbounded in every direction, negatives included.
+class ChunkedMaze:
+    def __init__(self, seed=0, chunk=64, generator="backtracker", max_bytes=64 << 20, openings=2):
+        self.seed = seed
+        self.chunk = chunk
+        self.generator = generator
+        self.openings = min(openings, chunk)
+        # Payload plus a rough allowance for the bytearray and cache entry
+        self.chunk_bytes = chunk * chunk + 200
+        self.max_chunks = max(1, max_bytes // self.chunk_bytes)
+        self.chunks = OrderedDict()
+        self.generated = 0
+        self.evicted = 0
+
+    def rng(self, *key):
+        # String seeds are hashed with SHA-512, stable across runs and platforms
+        return random.Random("/".join(map(str, (self.seed,) + key)))
+
+    def seam(self, kind, cx, cy):
+        # Openings along the right ("v") or bottom ("h") edge of chunk (cx, cy)
+        return self.rng(kind, cx, cy).sample(range(self.chunk), self.openings)
+
+    def build(self, cx, cy):
+        c = self.chunk
+        tile = Maze(c, c)
+        tile.generate(self.generator, self.rng("chunk", cx, cy).getrandbits(63))
+        grid = tile.grid
+        for y in self.seam("v", cx, cy):
+            grid[y * c + c - 1] |= RIGHT
+        for y in self.seam("v", cx - 1, cy):
+            grid[y * c] |= LEFT
+        for x in self.seam("h", cx, cy):
+            grid[(c - 1) * c + x] |= BOTTOM
+        for x in self.seam("h", cx, cy - 1):
+            grid[x] |= TOP
+        return grid
+
+    def tile(self, cx, cy):
+        key = (cx, cy)
+        grid = self.chunks.get(key)
+        if grid is None:
+            grid = self.build(cx, cy)
+            self.generated += 1
+            self.chunks[key] = grid
+            if len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.chunks.move_to_end(key)
+        return grid
+
+    def in_bounds(self, x, y):
+        return True
+
+    def get(self, x, y):
+        c = self.chunk
+        cx, lx = divmod(x, c)
+        cy, ly = divmod(y, c)
+        return self.tile(cx, cy)[ly * c + lx]
+
+    def passages_from(self, x, y):
+        mask = self.get(x, y)
+        for bit, vec in DIR_VECTORS.items():
+            if mask & bit:
+                yield x + vec[0], y + vec[1]
+
+    def memory(self):
+        return len(self.chunks) * self.chunk_bytes
+
+    def stats(self):
+        return {"chunks_loaded": len(self.chunks), "generated": self.generated, "evicted": self.evicted,
+                "memory_kb": self.memory() / 1024}
+
+
+# Search state lives in flat arrays indexed by Maze.idx: an int32 predecessor and
+# distance per cell plus one flag byte (OPEN/CLOSED), about 10 bytes per cell.
+# Nodes are flat indices internally; start, goal and paths stay (x, y) tuples.
 class Pathfinder:
     def __init__(self, maze, start, goal):
         self.maze = maze
         self.start = start
         self.goal = goal
-        self.came_from = {}
-        self.g_score = {}
+        n = maze.cols * maze.rows
+        self.start_i = maze.idx(*start)
+        self.goal_i = maze.idx(*goal)
+        self.allocate(n)
+        self.flags = bytearray(n)
+        self.offsets = maze.index_offsets()
         self.open_set = []
-        self.open_lookup = set()
-        self.closed_set = set()
+        self.open_count = 0
         self.counter = 0
         self.finished = False
         self.found = False
+        self.expanded = 0
+        self.peak_open = 0
+        # Flat indices whose flag changed since the last take_changes(); None = not tracked
+        self.changed = None
+
+    def allocate(self, n):
+        self.came_from = array('i', [-1]) * n
+        self.g_score = array('i', [INF]) * n
+
+    @classmethod
+    def prepare(cls, maze):
+        # Per-maze precomputation shared by every search on it; timed apart in --bench
+        pass
+
+    def coords(self, i):
+        y, x = divmod(i, self.maze.cols)
+        return x, y
+
+    def run(self):
+        # Search to the end; subclasses with a tighter loop than repeated step() override it
+        while not self.finished:
+            self.step()
+        return self
 
     def reconstruct_path(self):
         path = []
-        cur = self.goal
-        while cur != self.start:
-            path.append(cur)
-            cur = self.came_from.get(cur)
-            if cur is None:
+        cur = self.goal_i
+        while cur != self.start_i:
+            path.append(self.coords(cur))
+            cur = self.came_from[cur]
+            if cur < 0:
                 return []
         path.append(self.start)
         path.reverse()
         return path
 
-    def neighbors(self, node):
-        x, y = node
-        for nx, ny in self.maze.passages_from(x, y):
-            yield nx, ny
+    def neighbors(self, i):
+        mask = self.maze.grid[i]
+        for bit, offset in self.offsets:
+            if mask & bit:
+                yield i + offset
+
+    def take_changes(self):
+        changed = self.changed
+        self.changed = []
+        return changed or []
+
+
+# Shared best-first core for Dijkstra and A*. The priority of a node is its g score
+# plus heuristic(i), or just g when there is no heuristic. Heap entries are single
+# ints packing (priority, push counter, node) so they compare like the tuples they
+# replace without allocating one per push, and neighbors come from Maze.move_table().
+# step() expands one node for the animation; run() keeps the whole search in one loop.
+class BestFirst(Pathfinder):
+    NODE_BITS = 31
+
+    def __init__(self, maze, start, goal, heuristic=None):
+        super().__init__(maze, start, goal)
+        self.priority_h = heuristic
+        self.moves = maze.move_table()
+        self.g_score[self.start_i] = 0
+        self.push(0 if heuristic is None else heuristic(self.start_i), self.start_i)
+
+    def push(self, priority, i):
+        self.counter += 1
+        bits = self.NODE_BITS
+        heapq.heappush(self.open_set, ((priority << bits | self.counter) << bits) | i)
+        self.flags[i] = OPEN
+        if self.changed is not None:
+            self.changed.append(i)
+        self.open_count += 1
+        if self.open_count > self.peak_open:
+            self.peak_open = self.open_count
 
+    def expand(self, limit):
+        # Pops up to limit nodes; the counters live in locals until the loop is done
+        if self.finished:
+            return
+        heap = self.open_set
+        flags = self.flags
+        g_score = self.g_score
+        came_from = self.came_from
+        grid = self.maze.grid
+        moves = self.moves
+        changed = self.changed
+        heuristic = self.priority_h
+        goal = self.goal_i
+        bits = self.NODE_BITS
+        node_mask = (1 << bits) - 1
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        counter = self.counter
+        open_count = self.open_count
+        peak_open = self.peak_open
+        expanded = self.expanded
+        while limit and heap:
+            current = heappop(heap) & node_mask
+            # A node whose g improved while queued has been pushed again: skip stale entries
+            if flags[current] == CLOSED:
+                continue
+            limit -= 1
+            open_count -= 1
+            if changed is not None:
+                changed.append(current)
+            if current == goal:
+                flags[current] = 0
+                self.finished = True
+                self.found = True
+                break
+            flags[current] = CLOSED
+            expanded += 1
+            tentative_g = g_score[current] + 1
+            for offset in moves[grid[current]]:
+                n = current + offset
+                if flags[n] == CLOSED or tentative_g >= g_score[n]:
+                    continue
+                came_from[n] = current
+                g_score[n] = tentative_g
+                # On mazes with loops an open node can be reached by a shorter way; it is
+                # queued again at its new priority and the old entry goes stale
+                priority = tentative_g if heuristic is None else tentative_g + heuristic(n)
+                counter += 1
+                heappush(heap, ((priority << bits | counter) << bits) | n)
+                if flags[n] != OPEN:
+                    flags[n] = OPEN
+                    if changed is not None:
+                        changed.append(n)
+                    open_count += 1
+                    if open_count > peak_open:
+                        peak_open = open_count
+        if not heap:
+            self.finished = True
+        self.counter = counter
+        self.open_count = open_count
+        self.peak_open = peak_open
+        self.expanded = expanded
+
+    def step(self):
+        self.expand(1)
+
+    def run(self):
+        # Every cell is expanded at most once, so this many expansions always reach the end
+        self.expand(len(self.flags))
+        return self
+
+
+class Dijkstra(BestFirst):
+    name = "Dijkstra"
+
+
+class AStar(BestFirst):
+    name = "A*"
 
-class Dijkstra(Pathfinder):
     def __init__(self, maze, start, goal):
+        super().__init__(maze, start, goal, self.heuristic)
+
+    def heuristic(self, i):
+        y, x = divmod(i, self.maze.cols)
+        return abs(x - self.goal[0]) + abs(y - self.goal[1])
+
+
+# The Dijkstra and A* step() these classes had before BestFirst: a tuple per heap entry,
+# a push() call and a neighbors() generator per cell. Only --core-bench uses it, as the
+# baseline for the shared core.
+class ReferenceSearch(Pathfinder):
+    def __init__(self, maze, start, goal, astar=False):
         super().__init__(maze, start, goal)
-        self.g_score[start] = 0
-        heapq.heappush(self.open_set, (0, self.counter, start))
-        self.open_lookup.add(start)
+        self.astar = astar
+        self.g_score[self.start_i] = 0
+        self.push(self.heuristic(self.start_i), self.start_i)
+
+    def heuristic(self, i):
+        if not self.astar:
+            return 0
+        y, x = divmod(i, self.maze.cols)
+        return abs(x - self.goal[0]) + abs(y - self.goal[1])
+
+    def push(self, priority, i):
+        self.counter += 1
+        heapq.heappush(self.open_set, (priority, self.counter, i))
+        self.flags[i] = OPEN
+        if self.changed is not None:
+            self.changed.append(i)
+        self.open_count += 1
+        if self.open_count > self.peak_open:
+            self.peak_open = self.open_count
 
     def step(self):
         if not self.open_set or self.finished:
             self.finished = True
             return
         _, _, current = heapq.heappop(self.open_set)
-        self.open_lookup.discard(current)
-        if current == self.goal:
+        self.open_count -= 1
+        if self.changed is not None:
+            self.changed.append(current)
+        if current == self.goal_i:
+            self.flags[current] = 0
             self.finished = True
             self.found = True
             return
-        self.closed_set.add(current)
-        cxg = self.g_score[current]
+        flags = self.flags
+        g_score = self.g_score
+        flags[current] = CLOSED
+        self.expanded += 1
+        tentative_g = g_score[current] + 1
+        heuristic = self.heuristic
         for n in self.neighbors(current):
-            tentative_g = cxg + 1
-            if n in self.closed_set:
+            if flags[n] == CLOSED:
                 continue
-            if tentative_g < self.g_score.get(n, float('inf')):
+            if tentative_g < g_score[n]:
                 self.came_from[n] = current
-                self.g_score[n] = tentative_g
-                if n not in self.open_lookup:
-                    self.counter += 1
-                    heapq.heappush(self.open_set, (tentative_g, self.counter, n))
-                    self.open_lookup.add(n)
+                g_score[n] = tentative_g
+                if flags[n] != OPEN:
+                    self.push(tentative_g + heuristic(n), n)
+
+
+# Dijkstra from both ends at once, always expanding the smaller frontier. The searches
+# stop once the two frontier minimums add up to at least the best meeting distance, so
+# on long mazes each side only covers about half the distance.
+class Bidirectional(Pathfinder):
+    name = "Bidirectional"
+
+    def __init__(self, maze, start, goal):
+        super().__init__(maze, start, goal)
+        n = maze.cols * maze.rows
+        self.came_back = array('i', [-1]) * n
+        self.g_back = array('i', [INF]) * n
+        self.closed_fwd = bytearray(n)
+        self.closed_back = bytearray(n)
+        self.open_back = []
+        self.best = INF
+        self.meet = -1
+        if self.start_i == self.goal_i:
+            self.best = 0
+            self.meet = self.start_i
+        self.g_score[self.start_i] = 0
+        self.g_back[self.goal_i] = 0
+        self.push_side(self.open_set, 0, self.start_i)
+        self.push_side(self.open_back, 0, self.goal_i)
+
+    def push_side(self, heap, priority, i):
+        self.counter += 1
+        heapq.heappush(heap, (priority, self.counter, i))
+        if self.flags[i] != CLOSED:
+            self.flags[i] = OPEN
+            if self.changed is not None:
+                self.changed.append(i)
+        self.open_count += 1
+        if self.open_count > self.peak_open:
+            self.peak_open = self.open_count
+
+    def step(self):
+        if self.finished:
+            return
+        fwd, back = self.open_set, self.open_back
+        if not fwd or not back or fwd[0][0] + back[0][0] >= self.best:
+            self.finished = True
+            self.found = self.meet >= 0
+            return
+
+        if len(fwd) <= len(back):
+            heap, closed, g_score, came_from, g_other = fwd, self.closed_fwd, self.g_score, self.came_from, self.g_back
+        else:
+            heap, closed, g_score, came_from, g_other = back, self.closed_back, self.g_back, self.came_back, self.g_score
+        _, _, current = heapq.heappop(heap)
+        self.open_count -= 1
+        closed[current] = 1
+        self.flags[current] = CLOSED
+        if self.changed is not None:
+            self.changed.append(current)
+        self.expanded += 1
+
+        tentative_g = g_score[current] + 1
+        for n in self.neighbors(current):
+            if closed[n]:
+                continue
+            if tentative_g < g_score[n]:
+                came_from[n] = current
+                g_score[n] = tentative_g
+                self.push_side(heap, tentative_g, n)
+                if g_other[n] != INF and tentative_g + g_other[n] < self.best:
+                    self.best = tentative_g + g_other[n]
+                    self.meet = n
+
+    def reconstruct_path(self):
+        if self.meet < 0:
+            return []
+        head = []
+        cur = self.meet
+        while cur >= 0:
+            head.append(self.coords(cur))
+            cur = self.came_from[cur]
+        head.reverse()
+        cur = self.came_back[self.meet]
+        while cur >= 0:
+            head.append(self.coords(cur))
+            cur = self.came_back[cur]
+        return head
+
+
+# Corridor contraction
+# Cells with exactly two passages are corridor cells: a search entering one can only
+# walk on. CorridorGraph keeps only junctions and dead ends as nodes and replaces every
+# corridor between two of them by one weighted edge, stored in CSR form (edge_start[v]
+# .. edge_start[v + 1] index edge_to/edge_weight/edge_bit). edge_bit is the passage
+# leaving the node, which is enough to walk the corridor again and expand a path.
+class CorridorGraph:
+    def __init__(self, maze):
+        self.maze = maze
+        grid = maze.grid
+        self.step = {bit: offset for bit, offset in maze.index_offsets()}
+
+        degree = np.frombuffer(DEGREE, dtype=np.uint8)[maze.mask_array()]
+        corridor = degree == 2
+        self.node_of = array('i', [-1]) * len(grid)
+        self.node_cell = array('i')
+        self.edge_start = array('i', [0])
+        self.edge_to = array('i')
+        self.edge_weight = array('i')
+        self.edge_bit = bytearray()
+        for cell in np.flatnonzero(~corridor).tolist():
+            self.add_node(cell)
+        seen = bytearray(len(grid))
+        for v in range(len(self.node_cell)):
+            self.add_edges(v, seen)
+
+        # A ring of corridor cells has no junction to start from: promote one cell per ring
+        unseen = corridor & (np.frombuffer(bytes(seen), dtype=np.uint8) == 0)
+        for cell in np.flatnonzero(unseen).tolist():
+            if not seen[cell]:
+                self.add_node(cell)
+                self.add_edges(len(self.node_cell) - 1, seen)
+
+    def add_node(self, cell):
+        self.node_of[cell] = len(self.node_cell)
+        self.node_cell.append(cell)
+
+    def add_edges(self, v, seen):
+        cell = self.node_cell[v]
+        mask = self.maze.grid[cell]
+        for bit in self.step:
+            if mask & bit:
+                end, weight, _ = self.follow(cell, bit, seen=seen)
+                self.edge_to.append(self.node_of[end])
+                self.edge_weight.append(weight)
+                self.edge_bit.append(bit)
+        self.edge_start.append(len(self.edge_to))
+
+    def __len__(self):
+        return len(self.node_cell)
+
+    def follow(self, cell, bit, stop=-1, seen=None):
+        # Walks from cell through bit until a node or stop; returns (end cell, length, last bit)
+        grid, step, node_of = self.maze.grid, self.step, self.node_of
+        cur = cell + step[bit]
+        length = 1
+        while node_of[cur] < 0 and cur != stop:
+            if seen is not None:
+                seen[cur] = 1
+            bit = grid[cur] & ~OPPOSITE[bit]
+            cur += step[bit]
+            length += 1
+        return cur, length, bit
+
+    def expand(self, cell, bit, target):
+        # Cells after cell along the corridor leaving through bit, up to target included
+        grid, step = self.maze.grid, self.step
+        cur = cell + step[bit]
+        cells = [cur]
+        while cur != target:
+            bit = grid[cur] & ~OPPOSITE[bit]
+            cur += step[bit]
+            cells.append(cur)
+        return cells
+
+
+# A* on a CorridorGraph, so every expansion jumps a whole corridor. Start and goal are
+# attached as two extra nodes when they sit inside a corridor, and the node path is
+# walked back into cells at the end. Only node cells show up as open/closed.
+class CorridorAStar(Pathfinder):
+    name = "Corridor A*"
+
+    def __init__(self, maze, start, goal):
+        self.graph = maze.corridors()
+        super().__init__(maze, start, goal)
+        graph = self.graph
+        m = len(graph)
+        self.cell_of = graph.node_cell + array('i', [self.start_i, self.goal_i])
+        self.extra = {}
+        self.start_node = graph.node_of[self.start_i]
+        if self.start_node < 0:
+            self.start_node = m
+        self.goal_node = graph.node_of[self.goal_i]
+        if self.goal_node < 0:
+            self.goal_node = self.start_node if self.start_i == self.goal_i else m + 1
+        if self.start_node == m and self.goal_node != m:
+            self.extra[m] = self.attach(self.start_i, self.goal_i)
+        if self.goal_node == m + 1:
+            for u, weight, bit in self.attach(self.goal_i, self.start_i):
+                # Skip the walk that reached a corridor start: attaching start covered it
+                if u != m:
+                    self.extra.setdefault(u, []).append((m + 1, weight, bit))
+        self.g_score[self.start_node] = 0
+        self.push(self.heuristic(self.start_node), self.start_node)
+
+    def allocate(self, n):
+        m = len(self.graph) + 2
+        self.came_from = array('i', [-1]) * m
+        self.came_bit = bytearray(m)
+        self.g_score = array('i', [INF]) * m
+        self.closed = bytearray(m)
+
+    @classmethod
+    def prepare(cls, maze):
+        maze.corridors()
+
+    def attach(self, cell, stop):
+        # Returns one (node, length, bit) per corridor direction from cell. Walks that end at
+        # stop point to its extra node. For start, bit leaves cell; for goal, bit leaves the
+        # node back towards cell, which is the direction the search will travel.
+        graph = self.graph
+        m = len(graph)
+        edges = []
+        for bit in graph.step:
+            if self.maze.grid[cell] & bit:
+                end, weight, last = graph.follow(cell, bit, stop)
+                to = graph.node_of[end]
+                if to < 0:
+                    to = m if end == self.start_i else m + 1
+                edges.append((to, weight, bit if cell == self.start_i else OPPOSITE[last]))
+        return edges
+
+    def heuristic(self, v):
+        y, x = divmod(self.cell_of[v], self.maze.cols)
+        return abs(x - self.goal[0]) + abs(y - self.goal[1])
+
+    def push(self, priority, v):
+        cell = self.cell_of[v]
+        self.counter += 1
+        heapq.heappush(self.open_set, (priority, self.counter, v))
+        self.flags[cell] = OPEN
+        if self.changed is not None:
+            self.changed.append(cell)
+        self.open_count += 1
+        if self.open_count > self.peak_open:
+            self.peak_open = self.open_count
+
+    def edges(self, v):
+        graph = self.graph
+        if v < len(graph):
+            for e in range(graph.edge_start[v], graph.edge_start[v + 1]):
+                yield graph.edge_to[e], graph.edge_weight[e], graph.edge_bit[e]
+        yield from self.extra.get(v, ())
+
+    def step(self):
+        if self.finished:
+            return
+        while True:
+            if not self.open_set:
+                self.finished = True
+                return
+            _, _, current = heapq.heappop(self.open_set)
+            self.open_count -= 1
+            # Edges have weights, so a node can be queued more than once: skip stale entries
+            if not self.closed[current]:
+                break
+        cell = self.cell_of[current]
+        if self.changed is not None:
+            self.changed.append(cell)
+        if current == self.goal_node:
+            self.flags[cell] = 0
+            self.finished = True
+            self.found = True
+            return
+        self.closed[current] = 1
+        self.flags[cell] = CLOSED
+        self.expanded += 1
+        g = self.g_score[current]
+        for to, weight, bit in self.edges(current):
+            if self.closed[to]:
+                continue
+            tentative_g = g + weight
+            if tentative_g < self.g_score[to]:
+                self.came_from[to] = current
+                self.came_bit[to] = bit
+                self.g_score[to] = tentative_g
+                self.push(tentative_g + self.heuristic(to), to)
+
+    def reconstruct_path(self):
+        if not self.found:
+            return []
+        segments = []
+        v = self.goal_node
+        while v != self.start_node:
+            u = self.came_from[v]
+            segments.append(self.graph.expand(self.cell_of[u], self.came_bit[v], self.cell_of[v]))
+            v = u
+        path = [self.start]
+        for segment in reversed(segments):
+            path.extend(self.coords(i) for i in segment)
+        return path
+
+
+# Distance fields
+# Every passage costs 1, so a full distance field needs no heap: breadth-first search
+# expands one whole frontier per level. A wide frontier is expanded with array operations
+# on the wall masks themselves: for each passage bit, the frontier cells whose mask has it
+# shift by that bit's flat index offset, cells already reached are dropped and distance
+# and parent are written in one go, so nothing is stored per cell beyond dist and parent.
+# Long narrow corridors make thousands of tiny levels where NumPy call overhead would
+# dominate, so a level under SMALL_FRONTIER cells runs as a Python loop over the maze's
+# move_table. dist holds INF and parent -1 for unreached cells.
+def bfs_distances(maze, source):
+    # Plain Python BFS, one cell at a time; the reference --field-bench compares against
+    dist = array('i', [INF]) * (maze.cols * maze.rows)
+    grid = maze.grid
+    offsets = maze.index_offsets()
+    dist[source] = 0
+    queue = deque([source])
+    while queue:
+        i = queue.popleft()
+        d = dist[i] + 1
+        mask = grid[i]
+        for bit, offset in offsets:
+            if mask & bit and dist[i + offset] == INF:
+                dist[i + offset] = d
+                queue.append(i + offset)
+    return dist
+
+
+class DistanceField:
+    SMALL_FRONTIER = 128
+
+    def __init__(self, maze, source):
+        self.maze = maze
+        self.source = source
+        n = maze.cols * maze.rows
+        # The Python loop works on arrays, NumPy on views of the same memory
+        dist_view = array('i', [INF]) * n
+        parent_view = array('i', [-1]) * n
+        self.dist = dist = np.frombuffer(dist_view, dtype=np.int32)
+        self.parent = parent = np.frombuffer(parent_view, dtype=np.int32)
+        grid = maze.grid
+        moves = maze.move_table()
+        offsets = maze.index_offsets()
+        masks = None
+
+        dist_view[source] = 0
+        frontier = [source]
+        d = 0
+        while len(frontier):
+            d += 1
+            if len(frontier) < self.SMALL_FRONTIER:
+                if not isinstance(frontier, list):
+                    frontier = frontier.tolist()
+                level = []
+                append = level.append
+                for i in frontier:
+                    for offset in moves[grid[i]]:
+                        j = i + offset
+                        if dist_view[j] == INF:
+                            dist_view[j] = d
+                            parent_view[j] = i
+                            append(j)
+                frontier = level
+                continue
+
+            if masks is None:
+                masks = maze.mask_array()
+            frontier = np.asarray(frontier, dtype=np.int32)
+            open_ = masks[frontier]
+            sides = [frontier[(open_ & bit) != 0] for bit, _ in offsets]
+            sources = np.concatenate(sides)
+            cells = np.concatenate([side + offset for side, (_, offset) in zip(sides, offsets)])
+            new = dist[cells] == INF
+            cells = cells[new]
+            sources = sources[new]
+            dist[cells] = d
+            parent[cells] = sources
+            # A cell reached from two frontier cells is listed twice; keep the write that won
+            frontier = cells[parent[cells] == sources]
+        self.levels = d - 1
+
+    def grid(self):
+        return self.dist.reshape(self.maze.rows, self.maze.cols)
+
+    def path_to(self, target):
+        # (x, y) path from the source to target, empty if target is unreachable
+        if self.dist[target] == INF:
+            return []
+        cols = self.maze.cols
+        path = []
+        i = target
+        while i >= 0:
+            y, x = divmod(i, cols)
+            path.append((x, y))
+            i = int(self.parent[i])
+        path.reverse()
+        return path
+
+
+# Landmarks (ALT)
+# For any landmark L the triangle inequality gives d(v, goal) >= |d(L, goal) - d(L, v)|,
+# so BFS distances from a few well spread landmarks make an admissible and consistent
+# heuristic that knows about walls, unlike Manhattan. The table is cell-major (the k
+# distances of a cell are contiguous) and can be saved and mapped back with mmap.
+class Landmarks:
+    # magic, cols, rows, k, crc32 of the wall grid
+    HEADER = struct.Struct("<4s3iI")
+    MAGIC = b"ALT1"
+
+    def __init__(self, maze, k=8, cells=None, table=None):
+        self.cols = maze.cols
+        self.rows = maze.rows
+        self.k = k
+        self.checksum = maze.checksum()
+        self.mapping = None
+        if table is not None:
+            self.cells = cells
+            self.table = table
+            return
+
+        # Farthest-point selection: each landmark is the cell farthest from those already
+        # picked, starting from the cell farthest from the top-left corner
+        n = maze.cols * maze.rows
+        nearest = DistanceField(maze, 0).dist
+        nearest[nearest == INF] = -1
+        columns = np.empty((n, k), dtype=np.int32)
+        self.cells = []
+        for j in range(k):
+            cell = int(np.argmax(nearest))
+            self.cells.append(cell)
+            dist = DistanceField(maze, cell).dist
+            columns[:, j] = dist
+            np.minimum(nearest, np.where(dist == INF, -1, dist), out=nearest)
+        self.table = memoryview(columns.reshape(-1)).cast('B').cast('i')
+
+    @staticmethod
+    def filename(maze, k):
+        # Named after the wall grid checksum, so each maze finds its own tables
+        return f"alt_{maze.cols}x{maze.rows}_{maze.checksum():08x}_k{k}.bin"
+
+    def heuristic_row(self, i):
+        return self.table[i * self.k:(i + 1) * self.k]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.cols, self.rows, self.k, self.checksum))
+            f.write(array('i', self.cells).tobytes())
+            f.write(self.table)
+
+    @classmethod
+    def load(cls, path, maze):
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if mapping.size() < cls.HEADER.size:
+                raise ValueError(f"{path}: not a landmark file")
+            magic, cols, rows, k, checksum = cls.HEADER.unpack_from(mapping)
+            if magic != cls.MAGIC or k <= 0:
+                raise ValueError(f"{path}: not a landmark file")
+            if (cols, rows, checksum) != (maze.cols, maze.rows, maze.checksum()):
+                raise ValueError(f"{path}: landmark tables were built for another maze")
+            start = cls.HEADER.size + 4 * k
+            if mapping.size() != start + 4 * k * cols * rows:
+                raise ValueError(f"{path}: truncated landmark file")
+        except ValueError:
+            mapping.close()
+            raise
+        view = memoryview(mapping)
+        cells = list(view[cls.HEADER.size:start].cast('i'))
+        landmarks = cls(maze, k, cells, view[start:].cast('i'))
+        landmarks.mapping = mapping
+        return landmarks
+
+    def close(self):
+        if self.mapping is not None:
+            self.table.release()
+            self.mapping.close()
+            self.mapping = None
+
+
+# A* whose heuristic is the larger of Manhattan and the ALT bound from maze.landmarks()
+class ALTAStar(AStar):
+    name = "ALT A*"
+    # Set from --landmarks and --landmark-dir
+    k = 8
+    directory = None
 
+    def __init__(self, maze, start, goal):
+        self.landmarks = maze.landmarks(self.k, self.directory)
+        # A copy: a view would pin the mapping and keep Landmarks.close() from releasing it
+        self.goal_row = tuple(self.landmarks.heuristic_row(maze.idx(*goal)))
+        super().__init__(maze, start, goal)
+
+    @classmethod
+    def prepare(cls, maze):
+        maze.landmarks(cls.k, cls.directory)
+
+    def heuristic(self, i):
+        y, x = divmod(i, self.maze.cols)
+        h = abs(x - self.goal[0]) + abs(y - self.goal[1])
+        alt = max(map(abs, map(sub, self.landmarks.heuristic_row(i), self.goal_row)))
+        return alt if alt > h else h
+
+
+# Incremental replanning (D* Lite)
+# Searches backwards from the goal and keeps g/rhs values between calls. It subscribes
+# to Maze wall changes, and each change only re-queues the two cells on either side of
+# the wall, so replan() repairs the part of the search that the change invalidated.
+# move_start() lets the agent walk along the path; km keeps the old queue keys valid.
+# Queue entries are removed lazily: an entry counts only while the cell is flagged OPEN
+# and the key matches the one stored in key1/key2.
+class DStarLite(Pathfinder):
+    name = "D* Lite"
 
-class AStar(Pathfinder):
     def __init__(self, maze, start, goal):
         super().__init__(maze, start, goal)
-        self.g_score[start] = 0
-        f = abs(start[0] - goal[0]) + abs(start[1] - goal[1])
-        heapq.heappush(self.open_set, (f, self.counter, start))
-        self.open_lookup.add(start)
+        self.km = 0
+        self.last_i = self.start_i
+        self.rhs[self.goal_i] = 0
+        self.enqueue(self.goal_i)
+        maze.subscribe(self.on_wall_change)
+
+    def allocate(self, n):
+        self.g_score = array('i', [INF]) * n
+        self.rhs = array('i', [INF]) * n
+        self.key1 = array('i', [0]) * n
+        self.key2 = array('i', [0]) * n
+
+    def detach(self):
+        self.maze.unsubscribe(self.on_wall_change)
+
+    def h(self, a, b):
+        ay, ax = divmod(a, self.maze.cols)
+        by, bx = divmod(b, self.maze.cols)
+        return abs(ax - bx) + abs(ay - by)
+
+    def key(self, i):
+        m = min(self.g_score[i], self.rhs[i])
+        return m + self.h(self.start_i, i) + self.km, m
+
+    def enqueue(self, i):
+        k1, k2 = self.key(i)
+        self.key1[i] = k1
+        self.key2[i] = k2
+        self.counter += 1
+        heapq.heappush(self.open_set, (k1, k2, self.counter, i))
+        if self.flags[i] != OPEN:
+            self.flags[i] = OPEN
+            self.open_count += 1
+            if self.open_count > self.peak_open:
+                self.peak_open = self.open_count
+        if self.changed is not None:
+            self.changed.append(i)
+
+    def dequeue(self, i, flag=0):
+        if self.flags[i] == OPEN:
+            self.open_count -= 1
+        self.flags[i] = flag
+        if self.changed is not None:
+            self.changed.append(i)
+
+    def top_key(self):
+        heap = self.open_set
+        while heap:
+            k1, k2, _, i = heap[0]
+            if self.flags[i] == OPEN and self.key1[i] == k1 and self.key2[i] == k2:
+                return k1, k2
+            heapq.heappop(heap)
+        return INF, INF
+
+    def update_vertex(self, i):
+        if i != self.goal_i:
+            best = INF
+            g_score = self.g_score
+            for n in self.neighbors(i):
+                if g_score[n] < best:
+                    best = g_score[n]
+            self.rhs[i] = best + 1 if best < INF else INF
+        if self.g_score[i] != self.rhs[i]:
+            self.enqueue(i)
+        elif self.flags[i] == OPEN:
+            self.dequeue(i, CLOSED)
+
+    def step(self):
+        if self.finished:
+            return
+        top = self.top_key()
+        s = self.start_i
+        if not self.open_set or (top >= self.key(s) and self.rhs[s] == self.g_score[s]):
+            self.finished = True
+            self.found = self.g_score[s] < INF
+            return
+
+        _, _, _, u = heapq.heappop(self.open_set)
+        new_key = self.key(u)
+        if top < new_key:
+            self.enqueue(u)
+            return
+        self.expanded += 1
+        self.dequeue(u, CLOSED)
+        if self.g_score[u] > self.rhs[u]:
+            self.g_score[u] = self.rhs[u]
+            for n in self.neighbors(u):
+                self.update_vertex(n)
+        else:
+            self.g_score[u] = INF
+            for n in self.neighbors(u):
+                self.update_vertex(n)
+            self.update_vertex(u)
+
+    def on_wall_change(self, i, j):
+        # Both cells may have lost or gained a successor: recompute their rhs
+        self.update_vertex(i)
+        self.update_vertex(j)
+        self.finished = False
+        self.found = False
+
+    def move_start(self, start):
+        self.start = start
+        self.start_i = self.maze.idx(*start)
+        self.km += self.h(self.last_i, self.start_i)
+        self.last_i = self.start_i
+        self.finished = False
+        self.found = False
+
+    def replan(self):
+        return solve(self)
+
+    def reconstruct_path(self):
+        # Greedy descent on g from start: every step goes to a neighbor one closer to goal
+        i = self.start_i
+        if self.g_score[i] >= INF:
+            return []
+        g_score = self.g_score
+        path = [self.coords(i)]
+        while i != self.goal_i:
+            g = g_score[i]
+            i = min(self.neighbors(i), key=g_score.__getitem__, default=-1)
+            # Only happens mid-replan, when g is not settled yet
+            if i < 0 or g_score[i] >= g:
+                return []
+            path.append(self.coords(i))
+        return path
+
+
+# A* on (x, y) coordinates with dict state, for mazes too large for per-cell arrays such
+# as ChunkedMaze. Only needs passages_from, so it only touches the chunks it walks through.
+# Same step/finished/found interface as the Pathfinder classes.
+class SparseAStar:
+    name = "Sparse A*"
+
+    def __init__(self, maze, start, goal):
+        self.maze = maze
+        self.start = start
+        self.goal = goal
+        self.came_from = {start: None}
+        self.g_score = {start: 0}
+        self.closed = set()
+        self.open_set = [(self.heuristic(start), 0, start)]
+        self.counter = 0
+        self.finished = False
+        self.found = False
+        self.expanded = 0
+        self.peak_open = 1
+
+    def heuristic(self, cell):
+        return abs(cell[0] - self.goal[0]) + abs(cell[1] - self.goal[1])
 
     def step(self):
         if not self.open_set or self.finished:
             self.finished = True
             return
         _, _, current = heapq.heappop(self.open_set)
-        self.open_lookup.discard(current)
+        if current in self.closed:
+            return
         if current == self.goal:
             self.finished = True
             self.found = True
             return
-        self.closed_set.add(current)
-        cxg = self.g_score[current]
-        for n in self.neighbors(current):
-            tentative_g = cxg + 1
-            if n in self.closed_set:
+        self.closed.add(current)
+        self.expanded += 1
+        tentative_g = self.g_score[current] + 1
+        for n in self.maze.passages_from(*current):
+            if n in self.closed:
                 continue
-            if tentative_g < self.g_score.get(n, float('inf')):
+            if tentative_g < self.g_score.get(n, INF):
                 self.came_from[n] = current
                 self.g_score[n] = tentative_g
-                if n not in self.open_lookup:
-                    self.counter += 1
-                    priority = tentative_g + abs(n[0] - self.goal[0]) + abs(n[1] - self.goal[1])
-                    heapq.heappush(self.open_set, (priority, self.counter, n))
-                    self.open_lookup.add(n)
+                self.counter += 1
+                heapq.heappush(self.open_set, (tentative_g + self.heuristic(n), self.counter, n))
+        if len(self.open_set) > self.peak_open:
+            self.peak_open = len(self.open_set)
+
+    def run(self):
+        while not self.finished:
+            self.step()
+        return self
+
+    def reconstruct_path(self):
+        if not self.found:
+            return []
+        path = []
+        cur = self.goal
+        while cur is not None:
+            path.append(cur)
+            cur = self.came_from[cur]
+        path.reverse()
+        return path
+
+
+ALGORITHMS = [Dijkstra, AStar]
+# Selectable with --algorithms; --bench runs all of them by default
+PATHFINDERS = {
+    "dijkstra": Dijkstra,
+    "astar": AStar,
+    "bidirectional": Bidirectional,
+    "corridor": CorridorAStar,
+    "alt": ALTAStar,
+    "dstar": DStarLite,
+}
+
+
+# Path service
+# Answers batches of (start, goal) queries against one maze. Queries are grouped by goal
+# and each goal gets one reverse BFS tree (a flow field: the next cell towards the goal
+# from every cell), so any number of starts heading to it share one search. The tree is
+# cut into heavy paths (each cell continues through the child with the largest subtree)
+# and every path is stored contiguously, deepest cell first; a route to the goal then
+# crosses at most log2(cells) of them and is copied out as that many slices.
+# Paths are array('i') of flat cell indices from start to goal, empty when the goal is
+# unreachable. Finished paths go to an LRU cache keyed by (maze version, start, goal)
+# and bounded by the total number of cells it holds; flow fields are kept in a second
+# LRU keyed by (maze version, goal), bounded by the maze cells they cover (each one holds
+# five int32 arrays, about 20 bytes per cell).
+class FlowField:
+    def __init__(self, maze, goal):
+        self.maze = maze
+        self.goal_i = maze.idx(*goal)
+        field = DistanceField(maze, self.goal_i)
+        dist, parent = field.dist, field.parent
+        reached = np.flatnonzero(dist != INF)
+
+        # Subtree sizes and heavy child, children before parents
+        size = array('i', [1]) * len(dist)
+        best = array('i', [0]) * len(dist)
+        heavy = array('i', [-1]) * len(dist)
+        deepest_first = reached[np.argsort(dist[reached], kind="stable")[::-1]]
+        for v, p in zip(deepest_first.tolist(), parent[deepest_first].tolist()):
+            if p >= 0:
+                s = size[v]
+                size[p] += s
+                if s > best[p]:
+                    best[p] = s
+                    heavy[p] = v
+
+        # Head of each heavy path (the cell nearest the goal) by pointer doubling
+        heavy = np.frombuffer(heavy, dtype=np.int32)
+        up = np.arange(len(dist), dtype=np.int32)
+        on_path = reached[(parent[reached] >= 0) & (heavy[parent[reached]] == reached)]
+        up[on_path] = parent[on_path]
+        while True:
+            jumped = up[up]
+            if np.array_equal(jumped, up):
+                break
+            up = jumped
+        layout = reached[np.lexsort((-dist[reached], up[reached]))].astype(np.int32)
+        slot = np.zeros(len(dist), dtype=np.int32)
+        slot[layout] = np.arange(len(layout), dtype=np.int32)
+
+        # Raw bytes, so a slice can be appended to an array('i') without a copy
+        self.layout = memoryview(layout).cast('B')
+        self.head = memoryview(up)
+        self.slot = memoryview(slot)
+        self.toward = memoryview(parent)
+        self.dist = memoryview(dist)
+
+    def path_from(self, start):
+        i = self.maze.idx(*start)
+        path = array('i')
+        if self.dist[i] == INF:
+            return path
+        head, slot, toward, layout = self.head, self.slot, self.toward, self.layout
+        while i >= 0:
+            h = head[i]
+            path.frombytes(layout[4 * slot[i]:4 * slot[h] + 4])
+            i = toward[h]
+        return path
+
+
+class PathService:
+    def __init__(self, maze, cache_cells=1 << 24, field_cells=1 << 22):
+        self.maze = maze
+        # 4 bytes per cached path cell: the default holds 64 MB of paths
+        self.cache_cells = cache_cells
+        # About 20 bytes per field cell: the default holds 80 MB of flow fields, and the
+        # most recent field is always kept
+        self.field_cells = field_cells
+        self.paths = OrderedDict()
+        self.cached_cells = 0
+        self.fields = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fields_built = 0
+
+    def field(self, goal):
+        key = (self.maze.version, goal)
+        field = self.fields.get(key)
+        if field is None:
+            field = FlowField(self.maze, goal)
+            self.fields_built += 1
+            self.fields[key] = field
+            cells = self.maze.cols * self.maze.rows
+            while len(self.fields) > 1 and len(self.fields) * cells > self.field_cells:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(key)
+        return field
+
+    def query(self, start, goal):
+        return self.query_batch([(start, goal)])[0]
+
+    def query_batch(self, pairs):
+        version = self.maze.version
+        paths = self.paths
+        results = [None] * len(pairs)
+        by_goal = {}
+        for n, (start, goal) in enumerate(pairs):
+            key = (version, start, goal)
+            path = paths.get(key)
+            if path is None:
+                by_goal.setdefault(goal, []).append(n)
+            else:
+                paths.move_to_end(key)
+                results[n] = path
+        self.hits += len(pairs) - sum(len(group) for group in by_goal.values())
+
+        for goal, group in by_goal.items():
+            field = self.field(goal)
+            for n in group:
+                start = pairs[n][0]
+                key = (version, start, goal)
+                # The same pair can appear twice in one batch
+                path = paths.get(key)
+                if path is None:
+                    path = field.path_from(start)
+                    paths[key] = path
+                    self.cached_cells += len(path) + 1
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                results[n] = path
+        # Each entry also counts one cell, so unreachable (empty) paths are bounded too
+        while self.cached_cells > self.cache_cells:
+            self.cached_cells -= len(paths.popitem(last=False)[1]) + 1
+        return results
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "fields_built": self.fields_built,
+                "cached_paths": len(self.paths), "cached_cells": self.cached_cells,
+                "cached_fields": len(self.fields)}
+
+
+# Benchmark
+# Runs every algorithm to completion on seeded mazes without opening a window, so the
+# figures measure the search itself and not the animation.
+def parse_sizes(text):
+    sizes = []
+    for part in text.split(","):
+        cols, rows = part.lower().split("x")
+        sizes.append((int(cols), int(rows)))
+    return sizes
+
+
+def solve(pathfinder):
+    return pathfinder.run()
+
+
+def benchmark_run(algorithm, maze, start, goal):
+    t0 = time.perf_counter()
+    algorithm.prepare(maze)
+    prep = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    pathfinder = solve(algorithm(maze, start, goal))
+    elapsed = time.perf_counter() - t0
+    path = pathfinder.reconstruct_path() if pathfinder.found else []
+
+    # Separate run for memory: tracemalloc would distort the timing above
+    tracemalloc.start()
+    solve(algorithm(maze, start, goal))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "algorithm": algorithm.__name__,
+        "time_s": elapsed,
+        "prep_s": prep,
+        "expanded": pathfinder.expanded,
+        "peak_open": pathfinder.peak_open,
+        "path_len": len(path),
+        "peak_mem_kb": peak / 1024,
+    }
+
+
+def summarize(runs):
+    groups = {}
+    for run in runs:
+        groups.setdefault((run["cols"], run["rows"], run["algorithm"]), []).append(run)
+    summary = []
+    for (cols, rows, name), group in groups.items():
+        times = [r["time_s"] for r in group]
+        summary.append({
+            "cols": cols,
+            "rows": rows,
+            "algorithm": name,
+            "runs": len(group),
+            "time_mean_s": statistics.mean(times),
+            "time_median_s": statistics.median(times),
+            "time_stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+            "time_min_s": min(times),
+            "prep_mean_s": statistics.mean(r["prep_s"] for r in group),
+            "expanded_mean": statistics.mean(r["expanded"] for r in group),
+            "peak_open_mean": statistics.mean(r["peak_open"] for r in group),
+            "peak_mem_kb_mean": statistics.mean(r["peak_mem_kb"] for r in group),
+        })
+    return summary
+
+
+def write_rows(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_output(path, rows, summary=None):
+    # Benchmark results: .csv writes the rows (and the summary next to them as
+    # *_summary.csv), anything else one JSON document
+    if path.endswith(".csv"):
+        write_rows(path, rows)
+        if summary is not None:
+            write_rows(path[:-4] + "_summary.csv", summary)
+        return
+    report = {"runs": rows}
+    if summary is not None:
+        report["summary"] = summary
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def parse_algorithms(text):
+    return [PATHFINDERS[name.strip()] for name in text.split(",")]
+
+
+def run_benchmark(args):
+    algorithms = parse_algorithms(args.algorithms) if args.algorithms else list(PATHFINDERS.values())
+    runs = []
+    for cols, rows in parse_sizes(args.sizes):
+        start = (0, 0)
+        goal = (cols - 1, rows - 1)
+        for repeat in range(args.repeats):
+            seed = args.seed + repeat
+            maze = Maze(cols, rows)
+            maze.generate(args.generator, seed)
+            for algorithm in algorithms:
+                run = {"cols": cols, "rows": rows, "seed": seed, "repeat": repeat}
+                run.update(benchmark_run(algorithm, maze, start, goal))
+                runs.append(run)
+
+    summary = summarize(runs)
+    print(f"{'size':>11} {'algorithm':<14} {'mean ms':>10} {'median ms':>10} {'stdev ms':>9} {'prep ms':>9} "
+          f"{'expanded':>9} {'peak open':>9} {'mem KiB':>9}")
+    for s in summary:
+        print(f"{s['cols']:>5}x{s['rows']:<5} {s['algorithm']:<14} {1000 * s['time_mean_s']:10.3f} "
+              f"{1000 * s['time_median_s']:10.3f} {1000 * s['time_stdev_s']:9.3f} {1000 * s['prep_mean_s']:9.3f} "
+              f"{s['expanded_mean']:9.0f} {s['peak_open_mean']:9.0f} {s['peak_mem_kb_mean']:9.1f}")
+
+    if args.output:
+        write_output(args.output, runs, summary)
+    return runs, summary
+
+
+def run_generation_benchmark(args):
+    runs = []
+    for cols, rows in parse_sizes(args.sizes):
+        for name in GENERATORS:
+            for repeat in range(args.repeats):
+                maze = Maze(cols, rows)
+                t0 = time.perf_counter()
+                maze.generate(name, args.seed + repeat)
+                elapsed = time.perf_counter() - t0
+                runs.append({"cols": cols, "rows": rows, "generator": name, "seed": args.seed + repeat,
+                             "time_s": elapsed, "cells_per_s": cols * rows / elapsed})
+
+    print(f"{'size':>11} {'generator':<12} {'median ms':>10} {'cells/s':>12}")
+    for cols, rows in parse_sizes(args.sizes):
+        for name in GENERATORS:
+            group = [r for r in runs if (r["cols"], r["rows"], r["generator"]) == (cols, rows, name)]
+            t = statistics.median(r["time_s"] for r in group)
+            print(f"{cols:>5}x{rows:<5} {name:<12} {1000 * t:10.3f} {cols * rows / t:12.0f}")
+
+    if args.output:
+        write_output(args.output, runs)
+    return runs
+
+
+def random_queries(maze, count, goals, seed):
+    # count random starts spread over a few shared goals, as many agents heading to a few targets
+    rng = random.Random(seed)
+    targets = [(rng.randrange(maze.cols), rng.randrange(maze.rows)) for _ in range(goals)]
+    return [((rng.randrange(maze.cols), rng.randrange(maze.rows)), rng.choice(targets)) for _ in range(count)]
+
+
+def run_query_benchmark(args):
+    # Queries per second of the path service, cold (flow fields built) and warm (all
+    # cached), next to one A* per query on a sample of the same queries
+    runs = []
+    print(f"{'size':>11} {'mode':<16} {'queries':>8} {'time ms':>10} {'queries/s':>12}")
+    for cols, rows in parse_sizes(args.sizes):
+        maze = Maze(cols, rows)
+        maze.generate(args.generator, args.seed)
+        pairs = random_queries(maze, args.queries, args.goals, args.seed)
+
+        sample = pairs[:max(1, min(len(pairs), args.queries // 200))]
+        t0 = time.perf_counter()
+        for start, goal in sample:
+            solve(AStar(maze, start, goal)).reconstruct_path()
+        timings = [("astar per query", len(sample), time.perf_counter() - t0)]
+
+        cells = maze.cols * maze.rows
+        service = PathService(maze, cache_cells=len(pairs) * cells, field_cells=max(args.goals, 1) * cells)
+        for mode in ("service cold", "service warm"):
+            t0 = time.perf_counter()
+            for n in range(0, len(pairs), args.batch):
+                service.query_batch(pairs[n:n + args.batch])
+            timings.append((mode, len(pairs), time.perf_counter() - t0))
+
+        for mode, count, elapsed in timings:
+            runs.append({"cols": cols, "rows": rows, "mode": mode, "queries": count, "goals": args.goals,
+                         "time_s": elapsed, "queries_per_s": count / elapsed})
+            print(f"{cols:>5}x{rows:<5} {mode:<16} {count:>8} {1000 * elapsed:10.3f} {count / elapsed:12.0f}")
+
+    if args.output:
+        write_output(args.output, runs)
+    return runs
+
+
+def run_replan_benchmark(args):
+    # Random wall edits (add a wall on an open passage, carve a closed one) on mazes with
+    # extra loops; after each one D* Lite repairs its search while A* starts over
+    runs = []
+    print(f"{'size':>11} {'mode':<10} {'edits':>6} {'ms/edit':>10} {'expanded/edit':>14} {'first ms':>10}")
+    for cols, rows in parse_sizes(args.sizes):
+        rng = random.Random(args.seed)
+        maze = Maze(cols, rows)
+        maze.generate(args.generator, args.seed)
+        for _ in range(cols * rows // 10):
+            maze.carve(rng.randrange(cols), rng.randrange(rows), rng.choice(list(DIR_VECTORS)))
+        start = (0, 0)
+        goal = (cols - 1, rows - 1)
+
+        t0 = time.perf_counter()
+        dstar = DStarLite(maze, start, goal)
+        dstar.replan()
+        first = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        solve(AStar(maze, start, goal))
+        first_astar = time.perf_counter() - t0
+
+        totals = {"D* Lite": [0.0, 0], "A*": [0.0, 0]}
+        mismatches = 0
+        for _ in range(args.edits):
+            x, y = rng.randrange(cols), rng.randrange(rows)
+            d = rng.choice(list(DIR_VECTORS))
+            if maze.get(x, y) & d:
+                maze.add_wall(x, y, d)
+            else:
+                maze.carve(x, y, d)
+
+            expanded = dstar.expanded
+            t0 = time.perf_counter()
+            dstar.replan()
+            path = dstar.reconstruct_path()
+            totals["D* Lite"][0] += time.perf_counter() - t0
+            totals["D* Lite"][1] += dstar.expanded - expanded
+
+            t0 = time.perf_counter()
+            astar = solve(AStar(maze, start, goal))
+            totals["A*"][0] += time.perf_counter() - t0
+            totals["A*"][1] += astar.expanded
+            # Checked against BFS distances, not A*, so a wrong reference can't blame D* Lite
+            shortest = DistanceField(maze, maze.idx(*goal)).dist[maze.idx(*start)]
+            mismatches += len(path) != (0 if shortest == INF else shortest + 1)
+        dstar.detach()
+
+        for mode, first_s in (("D* Lite", first), ("A*", first_astar)):
+            elapsed, expanded = totals[mode]
+            edits = max(args.edits, 1)
+            runs.append({"cols": cols, "rows": rows, "mode": mode, "edits": args.edits, "time_s": elapsed,
+                         "ms_per_edit": 1000 * elapsed / edits, "expanded_per_edit": expanded / edits,
+                         "first_search_s": first_s})
+            print(f"{cols:>5}x{rows:<5} {mode:<10} {args.edits:>6} {1000 * elapsed / edits:10.3f} "
+                  f"{expanded / edits:14.1f} {1000 * first_s:10.3f}")
+        if mismatches:
+            print(f"warning: {mismatches} replanned paths are not shortest paths")
+
+    if args.output:
+        write_output(args.output, runs)
+    return runs
+
+
+# Batch runner
+# Sweeps sizes x generators x seeds x algorithms over a process pool. Mazes are generated
+# in the workers and sent back as their raw wall bytes (one byte per cell), then fanned
+# out again as one solve job per algorithm. Each result is appended to a JSONL file as
+# soon as it arrives; on restart, the (size, generator, seed, algorithm, landmarks)
+# combinations already in the file are skipped. Workers are spawned and re-import this
+# script, so settings main() puts on classes (ALTAStar.k, ALTAStar.directory) are passed
+# with each job instead.
+def _generate_job(cols, rows, generator, seed):
+    maze = Maze(cols, rows)
+    t0 = time.perf_counter()
+    maze.generate(generator, seed)
+    return maze.to_bytes(), time.perf_counter() - t0
+
+
+def _solve_job(cols, rows, grid, name, landmarks=ALTAStar.k, landmark_dir=None):
+    ALTAStar.k = landmarks
+    ALTAStar.directory = landmark_dir
+    maze = Maze.from_bytes(cols, rows, grid)
+    algorithm = PATHFINDERS[name]
+    t0 = time.perf_counter()
+    algorithm.prepare(maze)
+    prep = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    pathfinder = solve(algorithm(maze, (0, 0), (cols - 1, rows - 1)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "found": pathfinder.found,
+        "path_len": len(pathfinder.reconstruct_path()) if pathfinder.found else 0,
+        "expanded": pathfinder.expanded,
+        "peak_open": pathfinder.peak_open,
+        "time_s": elapsed,
+        "prep_s": prep,
+        "grid_crc": zlib.crc32(grid),
+    }
+
+
+def sweep_key(record):
+    # Records written before the landmark count was recorded used the default
+    return (record["cols"], record["rows"], record["generator"], record["seed"], record["algorithm"],
+            record.get("landmarks", ALTAStar.k))
+
+
+def load_sweep(path):
+    # Keys of the results already in path; a line cut short by an interrupted run is ignored
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                done.add(sweep_key(json.loads(line)))
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def run_sweep(args):
+    names = args.algorithms.split(",") if args.algorithms else list(PATHFINDERS)
+    generators = args.generators.split(",") if args.generators else [args.generator]
+    for name in names:
+        if name not in PATHFINDERS:
+            raise SystemExit(f"unknown algorithm {name!r}, expected one of {', '.join(PATHFINDERS)}")
+    for name in generators:
+        if name not in GENERATORS:
+            raise SystemExit(f"unknown generator {name!r}, expected one of {', '.join(GENERATORS)}")
+    path = args.output or "sweep.jsonl"
+    done = load_sweep(path)
+
+    tasks = []
+    for cols, rows in parse_sizes(args.sizes):
+        for generator in generators:
+            for seed in range(args.seed, args.seed + args.repeats):
+                todo = [n for n in names if (cols, rows, generator, seed, n, args.landmarks) not in done]
+                if todo:
+                    tasks.append((cols, rows, generator, seed, todo))
+    total = sum(len(task[4]) for task in tasks)
+    print(f"{len(done)} results already in {path}, {total} to run on {args.jobs} processes")
+
+    # Workers re-import this script; keep them from printing pygame's banner
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    ctx = multiprocessing.get_context("spawn")
+    # Only a few jobs in flight per process, so a sweep of millions does not queue millions of mazes
+    limit = 4 * args.jobs
+    queue = iter(tasks)
+    written = 0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs, mp_context=ctx) as pool, open(path, "a+") as out:
+        # An interrupted run can leave a partial last line: start on a fresh one
+        if out.tell() > 0:
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")
+        pending = {}
+        while True:
+            while len(pending) < limit:
+                task = next(queue, None)
+                if task is None:
+                    break
+                pending[pool.submit(_generate_job, *task[:4])] = (task, None)
+            if not pending:
+                break
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task, name = pending.pop(future)
+                cols, rows, generator, seed, todo = task
+                if name is None:
+                    grid, gen_time = future.result()
+                    for name in todo:
+                        job = pool.submit(_solve_job, cols, rows, grid, name, args.landmarks, args.landmark_dir)
+                        pending[job] = (task, (name, gen_time))
+                    continue
+                name, gen_time = name
+                record = {"cols": cols, "rows": rows, "generator": generator, "seed": seed,
+                          "algorithm": name, "landmarks": args.landmarks, "gen_time_s": gen_time}
+                record.update(future.result())
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                written += 1
+                if written % 100 == 0 or written == total:
+                    print(f"{written}/{total} results", flush=True)
+
+    elapsed = time.perf_counter() - t0
+    print(f"{written} results in {elapsed:.2f}s ({written / elapsed if elapsed else 0:.0f} results/s) -> {path}")
+    return written
+
+
+def run_field_benchmark(args):
+    # Full distance fields from the top-left cell: frontier BFS against the cell-at-a-time
+    # Python BFS, plus a Dijkstra corner-to-corner search for scale
+    runs = []
+    print(f"{'size':>11} {'method':<16} {'median ms':>10} {'cells/s':>12}")
+    for cols, rows in parse_sizes(args.sizes):
+        methods = {"frontier bfs": [], "python bfs": [], "dijkstra": []}
+        for repeat in range(args.repeats):
+            maze = Maze(cols, rows)
+            maze.generate(args.generator, args.seed + repeat)
+            t0 = time.perf_counter()
+            field = DistanceField(maze, 0)
+            methods["frontier bfs"].append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            reference = bfs_distances(maze, 0)
+            methods["python bfs"].append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            solve(Dijkstra(maze, (0, 0), (cols - 1, rows - 1)))
+            methods["dijkstra"].append(time.perf_counter() - t0)
+            if not np.array_equal(field.dist, np.frombuffer(reference, dtype=np.int32)):
+                print(f"warning: frontier BFS distances differ on seed {args.seed + repeat}")
+        for method, times in methods.items():
+            t = statistics.median(times)
+            runs.append({"cols": cols, "rows": rows, "method": method, "time_median_s": t,
+                         "cells_per_s": cols * rows / t})
+            print(f"{cols:>5}x{rows:<5} {method:<16} {1000 * t:10.3f} {cols * rows / t:12.0f}")
+
+    if args.output:
+        write_output(args.output, runs)
+    return runs
+
+
+def run_core_benchmark(args):
+    # Microbenchmark of the BestFirst core: the same corner-to-corner searches driven one
+    # step() at a time, as the window does, and by a single run() call, next to the
+    # pre-BestFirst step() loop of ReferenceSearch
+    runs = []
+    print(f"{'size':>11} {'algorithm':<10} {'driver':<7} {'median ms':>10} {'expanded/s':>12}")
+    for cols, rows in parse_sizes(args.sizes):
+        mazes = []
+        for repeat in range(args.repeats):
+            maze = Maze(cols, rows)
+            maze.generate(args.generator, args.seed + repeat)
+            mazes.append(maze)
+        for algorithm in (Dijkstra, AStar):
+            for driver in ("before", "step", "run"):
+                times = []
+                expanded = 0
+                for maze in mazes:
+                    if driver == "before":
+                        pathfinder = ReferenceSearch(maze, (0, 0), (cols - 1, rows - 1), algorithm is AStar)
+                    else:
+                        pathfinder = algorithm(maze, (0, 0), (cols - 1, rows - 1))
+                    t0 = time.perf_counter()
+                    if driver == "run":
+                        pathfinder.run()
+                    else:
+                        while not pathfinder.finished:
+                            pathfinder.step()
+                    times.append(time.perf_counter() - t0)
+                    expanded += pathfinder.expanded
+                t = statistics.median(times)
+                rate = expanded / sum(times)
+                runs.append({"cols": cols, "rows": rows, "algorithm": algorithm.__name__, "driver": driver,
+                             "time_median_s": t, "expanded_per_s": rate})
+                print(f"{cols:>5}x{rows:<5} {algorithm.__name__:<10} {driver:<7} {1000 * t:10.3f} {rate:12.0f}")
+
+    if args.output:
+        write_output(args.output, runs)
+    return runs
+
+
+def run_world_benchmark(args):
+    # Searches between random far apart points of a ChunkedMaze under a memory cap
+    world = ChunkedMaze(args.seed, args.chunk, args.generator, args.world_mb << 20)
+    rng = random.Random(args.seed)
+    print(f"{'query':>5} {'start':>16} {'goal':>16} {'path':>7} {'expanded':>9} {'ms':>9} "
+          f"{'chunks':>7} {'generated':>9} {'evicted':>8}")
+    runs = []
+    for q in range(args.repeats):
+        start = (rng.randrange(-args.distance, args.distance), rng.randrange(-args.distance, args.distance))
+        goal = (start[0] + rng.choice((-1, 1)) * args.distance, start[1] + rng.choice((-1, 1)) * args.distance // 2)
+        t0 = time.perf_counter()
+        pathfinder = solve(SparseAStar(world, start, goal))
+        elapsed = time.perf_counter() - t0
+        path = pathfinder.reconstruct_path()
+        run = {"start": start, "goal": goal, "found": pathfinder.found, "path_len": len(path),
+               "expanded": pathfinder.expanded, "time_s": elapsed}
+        run.update(world.stats())
+        runs.append(run)
+        print(f"{q:>5} {str(start):>16} {str(goal):>16} {len(path):>7} {pathfinder.expanded:>9} "
+              f"{1000 * elapsed:9.1f} {run['chunks_loaded']:>7} {run['generated']:>9} {run['evicted']:>8}")
+    print(f"cache {world.memory() / 1024:.0f} KiB of {args.world_mb} MiB")
+
+    if args.output:
+        write_output(args.output, runs)
+    return runs
+
+
+def save_maze(args):
+    t0 = time.perf_counter()
+    if args.generator == "eller":
+        # Streamed row by row: the maze is never held in memory
+        write_maze_rows(args.save, args.cols, args.rows, eller_rows(args.cols, args.rows, args.seed),
+                        args.seed, "eller")
+    else:
+        maze = Maze(args.cols, args.rows)
+        maze.generate(args.generator, args.seed)
+        maze.save(args.save)
+    size = os.path.getsize(args.save)
+    print(f"{args.cols}x{args.rows} {args.generator} maze (seed {args.seed}) -> {args.save}, "
+          f"{size / 1024:.1f} KiB in {time.perf_counter() - t0:.2f}s")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Maze + Dijkstra & A*")
+    parser.add_argument("--bench", action="store_true",
+                        help="headless benchmark: no window, every algorithm run to completion")
+    parser.add_argument("--algorithms", default=None,
+                        help=f"comma separated subset of {','.join(PATHFINDERS)} "
+                             "(default: dijkstra,astar in the window, all of them with --bench)")
+    parser.add_argument("--query-bench", action="store_true",
+                        help="headless benchmark of batched path queries (queries per second)")
+    parser.add_argument("--queries", type=int, default=20000, help="queries per maze size in --query-bench")
+    parser.add_argument("--goals", type=int, default=8, help="distinct goals shared by the queries")
+    parser.add_argument("--batch", type=int, default=1000, help="queries per query_batch call")
+    parser.add_argument("--field-bench", action="store_true",
+                        help="headless benchmark of whole-maze distance fields (frontier BFS vs Python)")
+    parser.add_argument("--core-bench", action="store_true",
+                        help="microbenchmark of the Dijkstra/A* search core, step() against run()")
+    parser.add_argument("--world-bench", action="store_true",
+                        help="headless benchmark: A* between far apart points of a chunked, lazily generated world")
+    parser.add_argument("--chunk", type=int, default=64, help="chunk side in cells for --world-bench")
+    parser.add_argument("--world-mb", type=int, default=16, help="chunk cache cap in MiB for --world-bench")
+    parser.add_argument("--distance", type=int, default=500, help="distance between endpoints in --world-bench")
+    parser.add_argument("--sweep", action="store_true",
+                        help="batch run: sizes x generators x seeds x algorithms on a process pool, "
+                             "results appended to --output (JSONL) and resumable")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes of --sweep")
+    parser.add_argument("--generators", default=None, help="comma separated generators swept by --sweep")
+    parser.add_argument("--replan-bench", action="store_true",
+                        help="headless benchmark of D* Lite replanning against A* from scratch after wall edits")
+    parser.add_argument("--edits", type=int, default=200, help="random wall edits per maze in --replan-bench")
+    parser.add_argument("--landmarks", type=int, default=ALTAStar.k, help="landmark count of the alt pathfinder")
+    parser.add_argument("--landmark-dir", default=None,
+                        help="directory where alt landmark tables are saved and memory-mapped back")
+    parser.add_argument("--steps-per-frame", type=float, default=1000 / SEARCH_SPEED_MS / FPS,
+                        help="search steps per frame (fractions allowed)")
+    parser.add_argument("--budget-ms", type=float, default=4.0, help="search time per frame in budget mode")
+    parser.add_argument("--mode", choices=StepScheduler.MODES, default="steps", help="initial search speed mode")
+    parser.add_argument("--save", default=None,
+                        help="generate one maze (--cols, --rows, --generator, --seed) into this file and exit")
+    parser.add_argument("--load", default=None, help="show this maze file instead of generating mazes")
+    parser.add_argument("--cols", type=int, default=COLS)
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--cell-size", type=int, default=CELL_SIZE, help="cell size in pixels")
+    parser.add_argument("--gen-bench", action="store_true",
+                        help="headless benchmark of the maze generators (cells generated per second)")
+    parser.add_argument("--generator", choices=list(GENERATORS), default="backtracker")
+    parser.add_argument("--sizes", default="31x21,63x63,127x127,255x255",
+                        help="comma separated COLSxROWS maze sizes")
+    parser.add_argument("--repeats", type=int, default=5, help="mazes per size")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first maze of each size")
+    parser.add_argument("--output", default=None, help="write the runs to a .csv or .json file")
+    return parser
+
+
+# Schedule
+# Decides how many pathfinder steps to take each frame, independently of the frame rate.
+#   steps    -> N steps per frame (fractions carry over, so 0.25 = one step every 4 frames)
+#   budget   -> as many steps as fit in a time budget per frame
+#   complete -> run to completion, still yielding once per frame so events stay handled
+class StepScheduler:
+    MODES = ("steps", "budget", "complete")
+    MAX_STEPS = 1 << 20
+    MAX_BUDGET_MS = 1000 / FPS * 0.8
+
+    def __init__(self, steps_per_frame, budget_ms, mode="steps"):
+        self.steps_per_frame = steps_per_frame
+        self.budget_ms = budget_ms
+        self.mode = mode
+        self.paused = False
+        self.carry = 0.0
+
+    def handle_key(self, key):
+        if key in (pygame.K_UP, pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            self.scale(2.0)
+        elif key in (pygame.K_DOWN, pygame.K_MINUS, pygame.K_KP_MINUS):
+            self.scale(0.5)
+        elif key == pygame.K_TAB:
+            self.mode = self.MODES[(self.MODES.index(self.mode) + 1) % len(self.MODES)]
+        elif key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+            self.mode = "complete"
+        elif key == pygame.K_SPACE:
+            self.paused = not self.paused
+        else:
+            return False
+        return True
+
+    def scale(self, factor):
+        if self.mode == "budget":
+            self.budget_ms = min(max(self.budget_ms * factor, 0.125), self.MAX_BUDGET_MS)
+        else:
+            if self.mode == "complete":
+                self.mode = "steps"
+            self.steps_per_frame = min(max(self.steps_per_frame * factor, 1 / 64), self.MAX_STEPS)
+
+    def run(self, pathfinder):
+        # Advances pathfinder for one frame and returns the number of steps taken
+        if self.paused or pathfinder.finished:
+            return 0
+        if self.mode == "steps":
+            self.carry += self.steps_per_frame
+            n = int(self.carry)
+            self.carry -= n
+            return self.run_steps(pathfinder, n)
+
+        budget_ms = self.budget_ms if self.mode == "budget" else self.MAX_BUDGET_MS
+        deadline = time.perf_counter() + budget_ms / 1000
+        steps = 0
+        while not pathfinder.finished and time.perf_counter() < deadline:
+            # Check the clock every few dozen steps only; one step is well under a microsecond
+            steps += self.run_steps(pathfinder, 32)
+        return steps
+
+    @staticmethod
+    def run_steps(pathfinder, n):
+        step = pathfinder.step
+        for i in range(n):
+            if pathfinder.finished:
+                return i
+            step()
+        return n
+
+    def label(self):
+        if self.paused:
+            return "paused"
+        if self.mode == "steps":
+            return f"{self.steps_per_frame:g} steps/frame"
+        if self.mode == "budget":
+            return f"{self.budget_ms:g} ms/frame"
+        return "run to completion"
+
 
 # Draw
-def draw_grid(screen, maze, start, goal, pathfinder, path):
-    screen.fill(COLOR_BG)
-    w = maze.cols * CELL_SIZE
-    h = maze.rows * CELL_SIZE
-
-    # Cell Floor
-    for y in range(maze.rows):
-        for x in range(maze.cols):
-            rect = pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(screen, COLOR_CELL, rect)
-
-    # Walls
-    wall_w = max(2, CELL_SIZE // 6)
-    for y in range(maze.rows):
-        for x in range(maze.cols):
-            mask = maze.get(x, y)
-            cx = x * CELL_SIZE
-            cy = y * CELL_SIZE
-            if not (mask & TOP):
-                pygame.draw.line(screen, COLOR_WALL, (cx, cy), (cx + CELL_SIZE, cy), wall_w)
-            if not (mask & LEFT):
-                pygame.draw.line(screen, COLOR_WALL, (cx, cy), (cx, cy + CELL_SIZE), wall_w)
-            if y == maze.rows - 1 and not (mask & BOTTOM):
-                pygame.draw.line(screen, COLOR_WALL, (cx, cy + CELL_SIZE), (cx + CELL_SIZE, cy + CELL_SIZE), wall_w)
-            if x == maze.cols - 1 and not (mask & RIGHT):
-                pygame.draw.line(screen, COLOR_WALL, (cx + CELL_SIZE, cy), (cx + CELL_SIZE, cy + CELL_SIZE), wall_w)
-
-    if pathfinder is not None:
-        for node in getattr(pathfinder, 'open_lookup', set()):
-            x, y = node
-            rect = pygame.Rect(x * CELL_SIZE + 3, y * CELL_SIZE + 3, CELL_SIZE - 6, CELL_SIZE - 6)
-            pygame.draw.rect(screen, COLOR_OPEN, rect)
-        for node in getattr(pathfinder, 'closed_set', set()):
-            x, y = node
-            rect = pygame.Rect(x * CELL_SIZE + 3, y * CELL_SIZE + 3, CELL_SIZE - 6, CELL_SIZE - 6)
-            pygame.draw.rect(screen, COLOR_CLOSED, rect)
-
-    # Path
-    if path:
-        for (x, y) in path:
-            rect = pygame.Rect(x * CELL_SIZE + 6, y * CELL_SIZE + 6, CELL_SIZE - 12, CELL_SIZE - 12)
-            pygame.draw.rect(screen, COLOR_PATH, rect)
-
-    # Start/End
-    if start:
-        x, y = start
-        rect = pygame.Rect(x * CELL_SIZE + 4, y * CELL_SIZE + 4, CELL_SIZE - 8, CELL_SIZE - 8)
-        pygame.draw.rect(screen, COLOR_START, rect)
-    if goal:
-        x, y = goal
-        rect = pygame.Rect(x * CELL_SIZE + 4, y * CELL_SIZE + 4, CELL_SIZE - 8, CELL_SIZE - 8)
-        pygame.draw.rect(screen, COLOR_END, rect)
-
-    pygame.display.flip()
+# The floor and walls of a maze never change, so they are baked once into a surface.
+# Each frame only the cells a pathfinder touched since the last frame are restored from
+# it, redrawn with their new state and pushed with pygame.display.update(rects).
+class MazeRenderer:
+    def __init__(self, screen, maze, cell_size=CELL_SIZE):
+        self.screen = screen
+        self.maze = maze
+        self.cell_size = cell_size
+        self.static = self.bake()
+        self.path = set()
+        self.start_i = self.goal_i = -1
+
+    def bake(self):
+        maze = self.maze
+        cs = self.cell_size
+        surf = pygame.Surface((maze.cols * cs, maze.rows * cs)).convert()
+        surf.fill(COLOR_CELL)
+
+        wall_w = max(1, cs // 6)
+        for y in range(maze.rows):
+            for x in range(maze.cols):
+                mask = maze.get(x, y)
+                cx = x * cs
+                cy = y * cs
+                if not (mask & TOP):
+                    pygame.draw.line(surf, COLOR_WALL, (cx, cy), (cx + cs, cy), wall_w)
+                if not (mask & LEFT):
+                    pygame.draw.line(surf, COLOR_WALL, (cx, cy), (cx, cy + cs), wall_w)
+                if y == maze.rows - 1 and not (mask & BOTTOM):
+                    pygame.draw.line(surf, COLOR_WALL, (cx, cy + cs), (cx + cs, cy + cs), wall_w)
+                if x == maze.cols - 1 and not (mask & RIGHT):
+                    pygame.draw.line(surf, COLOR_WALL, (cx + cs, cy), (cx + cs, cy + cs), wall_w)
+        return surf
+
+    def inset(self, i, pixels):
+        # Insets are given for the default 24 px cells and scaled to the actual size
+        cs = self.cell_size
+        d = pixels * cs // CELL_SIZE
+        y, x = divmod(i, self.maze.cols)
+        return pygame.Rect(x * cs + d, y * cs + d, cs - 2 * d, cs - 2 * d)
+
+    def reset(self, pathfinder, start, goal):
+        self.path = set()
+        self.start_i = self.maze.idx(*start)
+        self.goal_i = self.maze.idx(*goal)
+        self.screen.fill(COLOR_BG)
+        self.screen.blit(self.static, (0, 0))
+        for i in (self.start_i, self.goal_i):
+            self.draw_cell(i, 0)
+        pathfinder.changed = []
+        pygame.display.flip()
+
+    def draw_cell(self, i, flag):
+        cell = self.inset(i, 0)
+        self.screen.blit(self.static, cell, cell)
+        if flag == OPEN:
+            pygame.draw.rect(self.screen, COLOR_OPEN, self.inset(i, 3))
+        elif flag == CLOSED:
+            pygame.draw.rect(self.screen, COLOR_CLOSED, self.inset(i, 3))
+        if i in self.path:
+            pygame.draw.rect(self.screen, COLOR_PATH, self.inset(i, 6))
+        if i == self.start_i:
+            pygame.draw.rect(self.screen, COLOR_START, self.inset(i, 4))
+        elif i == self.goal_i:
+            pygame.draw.rect(self.screen, COLOR_END, self.inset(i, 4))
+        return cell
+
+    def redraw(self, pathfinder, path=None):
+        # Full repaint of the current search state, after something covered the maze
+        self.screen.blit(self.static, (0, 0))
+        flags = pathfinder.flags
+        cells = set(np.flatnonzero(np.frombuffer(bytes(flags), dtype=np.uint8)).tolist())
+        cells.update(self.path, (self.start_i, self.goal_i))
+        for i in cells:
+            self.draw_cell(i, flags[i])
+        pathfinder.take_changes()
+        pygame.display.flip()
+
+    def draw_field(self, field):
+        # Heatmap of a DistanceField, near = dark blue, far = yellow, unreached = wall color;
+        # the walls of the static layer go on top with the floor color keyed out
+        t = field.grid().T / max(field.levels, 1)
+        rgb = np.stack([np.interp(t, HEATMAP_STOPS, channel) for channel in zip(*HEATMAP_COLORS)], axis=-1)
+        rgb[field.grid().T == INF] = COLOR_WALL
+        heat = pygame.surfarray.make_surface(rgb.astype(np.uint8))
+        self.screen.blit(pygame.transform.scale(heat, self.static.get_size()), (0, 0))
+        self.static.set_colorkey(COLOR_CELL)
+        self.screen.blit(self.static, (0, 0))
+        self.static.set_colorkey(None)
+        pygame.display.flip()
+
+    def update(self, pathfinder, path=None):
+        changed = pathfinder.take_changes()
+        if path and not self.path:
+            self.path = {self.maze.idx(x, y) for x, y in path}
+            changed.extend(self.path)
+        if not changed:
+            return
+        flags = pathfinder.flags
+        pygame.display.update([self.draw_cell(i, flags[i]) for i in set(changed)])
 
 
 def main():
+    args = build_parser().parse_args()
+    ALTAStar.k = args.landmarks
+    ALTAStar.directory = args.landmark_dir
+    if args.landmark_dir:
+        os.makedirs(args.landmark_dir, exist_ok=True)
+    if args.bench:
+        run_benchmark(args)
+        return
+    if args.gen_bench:
+        run_generation_benchmark(args)
+        return
+    if args.query_bench:
+        run_query_benchmark(args)
+        return
+    if args.replan_bench:
+        run_replan_benchmark(args)
+        return
+    if args.sweep:
+        run_sweep(args)
+        return
+    if args.field_bench:
+        run_field_benchmark(args)
+        return
+    if args.core_bench:
+        run_core_benchmark(args)
+        return
+    if args.world_bench:
+        run_world_benchmark(args)
+        return
+
+    if args.save:
+        save_maze(args)
+        return
+
+    loaded = Maze.load(args.load) if args.load else None
+    if loaded:
+        args.cols, args.rows = loaded.cols, loaded.rows
+    cols, rows, cell_size = args.cols, args.rows, args.cell_size
     pygame.init()
-    screen = pygame.display.set_mode((COLS * CELL_SIZE, ROWS * CELL_SIZE))
-    pygame.display.set_caption("Maze + Dijkstra & A* Auto")
+    screen = pygame.display.set_mode((cols * cell_size, rows * cell_size))
     clock = pygame.time.Clock()
     font = pygame.font.SysFont(None, 36)
+    scheduler = StepScheduler(args.steps_per_frame, args.budget_ms, args.mode)
+    caption = None
 
     while True:
-        # Generate Maze
-        maze = Maze(COLS, ROWS)
-        maze.generate_recursive_backtracker()
+        # Generate Maze (or replay the loaded one)
+        if loaded:
+            maze = loaded
+        else:
+            maze = Maze(cols, rows)
+            maze.generate(args.generator)
+        renderer = MazeRenderer(screen, maze, cell_size)
         start = (0, 0)
-        goal = (COLS - 1, ROWS - 1)
-        path = []
+        goal = (cols - 1, rows - 1)
 
-        # Dijkstra
-        pathfinder = Dijkstra(maze, start, goal)
+        # Phases: "search" runs the current algorithm, "pause" waits for resume_at without
+        # blocking the event loop, "results" waits for a click
+        algorithms = iter(parse_algorithms(args.algorithms) if args.algorithms else ALGORITHMS)
+        times = []
+        pathfinder = next(algorithms)(maze, start, goal)
+        renderer.reset(pathfinder, start, goal)
+        search_start_time = time.time()
+        phase = "search"
+        resume_at = 0
         running_search = True
-        last_step_time = 0
-        dijkstra_start_time = time.time()
-        dijkstra_done = False
-        astar_done = False
-        astar_path = []
+        path = []
+        field = None
+        show_field = False
 
         while running_search:
-            now = pygame.time.get_ticks()
-
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit(0)
                 elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     running_search = False
-                    break
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_h and phase != "results":
+                    # Toggle the distance heatmap from start; the search waits while it is shown
+                    show_field = not show_field
+                    if show_field:
+                        if field is None:
+                            field = DistanceField(maze, maze.idx(*start))
+                        renderer.draw_field(field)
+                    else:
+                        renderer.redraw(pathfinder, path)
+                elif event.type == pygame.KEYDOWN:
+                    scheduler.handle_key(event.key)
+            if not running_search:
+                break
 
-            # Dijkstra step
-            if not dijkstra_done and not pathfinder.finished and now - last_step_time >= SEARCH_SPEED_MS:
-                last_step_time = now
-                pathfinder.step()
+            if show_field:
+                pass
+            elif phase == "search":
+                scheduler.run(pathfinder)
                 path = pathfinder.reconstruct_path() if pathfinder.finished and pathfinder.found else []
-                draw_grid(screen, maze, start, goal, pathfinder, path)
-
-            # Dijkstra ended
-            if not dijkstra_done and pathfinder.finished:
-                dijkstra_done = True
-                dijkstra_time = time.time() - dijkstra_start_time
-                pygame.display.flip()
-                pygame.time.delay(DELAY_BETWEEN_ALGORITHM)
-
-                # Start A*
-                pathfinder = AStar(maze, start, goal)
-                last_step_time = 0
-                astar_start_time = time.time()
-
-            # A* step
-            if dijkstra_done and not astar_done and not pathfinder.finished and now - last_step_time >= SEARCH_SPEED_MS:
-                last_step_time = now
-                pathfinder.step()
-                astar_path = pathfinder.reconstruct_path() if pathfinder.finished and pathfinder.found else []
-                draw_grid(screen, maze, start, goal, pathfinder, astar_path)
-
-            # A* ended
-            if dijkstra_done and not astar_done and pathfinder.finished:
-                astar_done = True
-                astar_time = time.time() - astar_start_time
-                draw_grid(screen, maze, start, goal, pathfinder, astar_path)
-                pygame.time.delay(DELAY_BETWEEN_ALGORITHM)
-
-                # Print time of 2 algorithm
-                screen.fill(COLOR_BG)
-                text1 = font.render(f"Dijkstra: {dijkstra_time:.3f}s", True, (255, 255, 255))
-                text2 = font.render(f"A*: {astar_time:.3f}s", True, (255, 255, 255))
-                text3 = font.render(f"Right click for generate and start a new maze...", True, (255, 255, 255))
-                screen.blit(text1, (20, 20))
-                screen.blit(text2, (20, 60))
-                screen.blit(text3, (20, 100))
-                pygame.display.flip()
-                # Right Click
-                waiting_click = True
-                while waiting_click:
-                    for event in pygame.event.get():
-                        if event.type == pygame.QUIT:
-                            pygame.quit()
-                            sys.exit(0)
-                        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                            waiting_click = False
-                    clock.tick(FPS)
-                running_search = False  # Start again
-
-            if not astar_done:
-                draw_grid(screen, maze, start, goal, pathfinder, path if not dijkstra_done else astar_path)
+                renderer.update(pathfinder, path)
+                if pathfinder.finished:
+                    times.append((pathfinder.name, time.time() - search_start_time))
+                    phase = "pause"
+                    resume_at = pygame.time.get_ticks() + DELAY_BETWEEN_ALGORITHM
+
+            elif phase == "pause" and pygame.time.get_ticks() >= resume_at:
+                algorithm = next(algorithms, None)
+                if algorithm is not None:
+                    pathfinder = algorithm(maze, start, goal)
+                    renderer.reset(pathfinder, start, goal)
+                    search_start_time = time.time()
+                    phase = "search"
+                else:
+                    # Print time of every algorithm
+                    screen.fill(COLOR_BG)
+                    y = 20
+                    for name, elapsed in times:
+                        screen.blit(font.render(f"{name}: {elapsed:.3f}s", True, (255, 255, 255)), (20, y))
+                        y += 40
+                    text = font.render(f"Right click for generate and start a new maze...", True, (255, 255, 255))
+                    screen.blit(text, (20, y))
+                    pygame.display.flip()
+                    phase = "results"
 
+            title = f"Maze + Dijkstra & A* Auto - {pathfinder.name} - {scheduler.label()}"
+            if title != caption:
+                pygame.display.set_caption(title)
+                caption = title
             clock.tick(FPS)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    multiprocessing.freeze_support()
+    main()
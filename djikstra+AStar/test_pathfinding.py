@@ -0,0 +1,200 @@
+import importlib.util
+import os
+import random
+
+import pytest
+
+# The script name is not a valid module name, so load it from its path
+_spec = importlib.util.spec_from_file_location(
+    "pathfinding", os.path.join(os.path.dirname(__file__), "djikstra+AStar.py"))
+pf = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pf)
+
+SIZES = ((1, 1), (2, 3), (9, 7), (24, 17))
+
+
+def make_maze(generator, cols, rows, seed, loops=False, isolate=None):
+    # A seeded perfect maze, optionally with extra passages and one cell walled off
+    maze = pf.Maze(cols, rows)
+    maze.generate(generator, seed)
+    rng = random.Random(seed)
+    if loops:
+        for _ in range(cols * rows // 4):
+            maze.carve(rng.randrange(cols), rng.randrange(rows), rng.choice(list(pf.DIR_VECTORS)))
+    if isolate is not None:
+        for d in pf.DIR_VECTORS:
+            maze.add_wall(*isolate, d)
+    return maze
+
+
+def mazes():
+    # Perfect and loopy mazes of every generator, some with an unreachable cell
+    n = 0
+    for generator in pf.GENERATORS:
+        for cols, rows in SIZES:
+            for loops in (False, True):
+                n += 1
+                isolate = (cols // 2, rows // 2) if n % 3 == 0 and cols * rows > 1 else None
+                yield make_maze(generator, cols, rows, n, loops, isolate), isolate
+
+
+def queries(maze, isolate, count=12):
+    rng = random.Random(maze.cols * 1000 + maze.rows)
+    cells = [(x, y) for y in range(maze.rows) for x in range(maze.cols)]
+    pairs = [((0, 0), (maze.cols - 1, maze.rows - 1)), ((0, 0), (0, 0))]
+    pairs += [(rng.choice(cells), rng.choice(cells)) for _ in range(count)]
+    if isolate is not None:
+        pairs += [((0, 0), isolate), (isolate, (0, 0))]
+    return pairs
+
+
+def shortest(maze, start, goal):
+    return int(pf.DistanceField(maze, maze.idx(*goal)).dist[maze.idx(*start)])
+
+
+def check_path(maze, path, start, goal):
+    d = shortest(maze, start, goal)
+    if d == pf.INF:
+        assert list(path) == []
+        return
+    path = [tuple(cell) for cell in path]
+    assert len(path) == d + 1
+    assert path[0] == start and path[-1] == goal
+    for a, b in zip(path, path[1:]):
+        assert b in set(maze.passages_from(*a))
+
+
+def test_distance_field_matches_python_bfs():
+    for maze, _ in mazes():
+        for source in (0, maze.cols * maze.rows - 1):
+            field = pf.DistanceField(maze, source)
+            assert list(field.dist) == list(pf.bfs_distances(maze, source))
+            for target in range(maze.cols * maze.rows):
+                path = field.path_to(target)
+                if field.dist[target] == pf.INF:
+                    assert path == []
+                else:
+                    assert len(path) == field.dist[target] + 1
+
+
+@pytest.mark.parametrize("name", list(pf.PATHFINDERS))
+def test_pathfinders_find_shortest_paths(name):
+    algorithm = pf.PATHFINDERS[name]
+    for maze, isolate in mazes():
+        algorithm.prepare(maze)
+        for start, goal in queries(maze, isolate):
+            pathfinder = pf.solve(algorithm(maze, start, goal))
+            assert pathfinder.finished
+            path = pathfinder.reconstruct_path()
+            assert pathfinder.found == (shortest(maze, start, goal) != pf.INF)
+            check_path(maze, path, start, goal)
+            if isinstance(pathfinder, pf.DStarLite):
+                pathfinder.detach()
+
+
+def test_astar_requeues_improved_open_cells():
+    # The maze --replan-bench builds for kruskal seed 35: A* once returned 197 steps for 195
+    cols, rows = 100, 51
+    rng = random.Random(35)
+    maze = pf.Maze(cols, rows)
+    maze.generate("kruskal", 35)
+    for _ in range(cols * rows // 10):
+        maze.carve(rng.randrange(cols), rng.randrange(rows), rng.choice(list(pf.DIR_VECTORS)))
+    start, goal = (0, 0), (cols - 1, rows - 1)
+    for algorithm in (pf.AStar, pf.ALTAStar, pf.Dijkstra):
+        check_path(maze, pf.solve(algorithm(maze, start, goal)).reconstruct_path(), start, goal)
+
+
+def test_stepping_matches_run():
+    for maze, isolate in mazes():
+        for start, goal in queries(maze, isolate, 4):
+            for algorithm in (pf.Dijkstra, pf.AStar):
+                ran = algorithm(maze, start, goal).run()
+                stepped = algorithm(maze, start, goal)
+                while not stepped.finished:
+                    stepped.step()
+                assert stepped.reconstruct_path() == ran.reconstruct_path()
+                assert stepped.expanded == ran.expanded
+
+
+def test_alt_with_saved_landmarks(tmp_path):
+    algorithm = pf.ALTAStar
+    k, directory = algorithm.k, algorithm.directory
+    algorithm.k, algorithm.directory = 3, str(tmp_path)
+    try:
+        for maze, isolate in mazes():
+            if maze.cols * maze.rows < 3:
+                continue
+            maze.landmarks(3, str(tmp_path))
+            # The second time the tables come back from the file
+            maze.invalidate()
+            assert maze.landmarks(3, str(tmp_path)).mapping is not None
+            for start, goal in queries(maze, isolate, 4):
+                check_path(maze, pf.solve(algorithm(maze, start, goal)).reconstruct_path(), start, goal)
+            maze.close()
+    finally:
+        algorithm.k, algorithm.directory = k, directory
+
+
+def test_sparse_astar():
+    for maze, isolate in mazes():
+        for start, goal in queries(maze, isolate):
+            check_path(maze, pf.solve(pf.SparseAStar(maze, start, goal)).reconstruct_path(), start, goal)
+
+
+def test_path_service():
+    for maze, isolate in mazes():
+        # Small bounds, so both caches evict during the batch
+        service = pf.PathService(maze, cache_cells=4 * (maze.cols + maze.rows), field_cells=2 * maze.cols * maze.rows)
+        pairs = queries(maze, isolate, 40)
+        for batch in (pairs, pairs[::-1]):
+            for (start, goal), path in zip(batch, service.query_batch(batch)):
+                check_path(maze, [divmod(i, maze.cols)[::-1] for i in path], start, goal)
+        assert service.cached_cells <= service.cache_cells
+
+
+def test_dstar_lite_after_wall_edits():
+    for maze, _ in mazes():
+        if maze.cols * maze.rows < 4:
+            continue
+        rng = random.Random(maze.cols * maze.rows)
+        start, goal = (0, 0), (maze.cols - 1, maze.rows - 1)
+        dstar = pf.DStarLite(maze, start, goal)
+        dstar.replan()
+        for _ in range(30):
+            x, y = rng.randrange(maze.cols), rng.randrange(maze.rows)
+            d = rng.choice(list(pf.DIR_VECTORS))
+            if maze.get(x, y) & d:
+                maze.add_wall(x, y, d)
+            else:
+                maze.carve(x, y, d)
+            dstar.replan()
+            path = dstar.reconstruct_path()
+            check_path(maze, path, start, goal)
+            # Walk one step along the path now and then
+            if len(path) > 2 and rng.random() < 0.3:
+                start = path[1]
+                dstar.move_start(start)
+                dstar.replan()
+                check_path(maze, dstar.reconstruct_path(), start, goal)
+        dstar.detach()
+        assert maze.listeners == []
+
+
+@pytest.mark.parametrize("generator", list(pf.GENERATORS))
+def test_save_load_round_trip(tmp_path, generator):
+    path = str(tmp_path / "maze.bin")
+    args = pf.build_parser().parse_args(["--save", path, "--cols", "13", "--rows", "8",
+                                         "--generator", generator, "--seed", "5"])
+    pf.save_maze(args)
+    expected = pf.Maze(13, 8)
+    expected.generate(generator, 5)
+    loaded = pf.Maze.load(path)
+    try:
+        assert (loaded.cols, loaded.rows, loaded.seed, loaded.generator) == (13, 8, 5, generator)
+        assert loaded.to_bytes() == expected.to_bytes()
+        assert loaded.checksum() == expected.checksum()
+        pf.Maze.from_bytes(13, 8, loaded.to_bytes())
+        check_path(loaded, pf.solve(pf.AStar(loaded, (0, 0), (12, 7))).reconstruct_path(), (0, 0), (12, 7))
+    finally:
+        loaded.close()